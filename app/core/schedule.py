@@ -4,9 +4,11 @@ Schedule Manager for managing relay schedules.
 This module handles the scheduling of relay state changes based on time and days of the week.
 """
 import asyncio
+import functools
+import heapq
 import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set, Tuple
 import logging
 from app.utils.validator import RelayConfig, RelaySchedule
 
@@ -29,10 +31,111 @@ DAY_VALUES = {
     "Saturday": 128
 }
 
+# Day names and bit values indexed by datetime.weekday() (Monday=0 .. Sunday=6)
+_WEEKDAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+_WEEKDAY_BITS = tuple(DAY_VALUES[day] for day in _WEEKDAY_NAMES)
+
+
+def _hhmm_to_minutes(value: str) -> int:
+    """
+    Convert an "HH:MM" string to minutes since midnight.
+    """
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+@functools.lru_cache(maxsize=256)
+def _is_valid_hhmm(value: str) -> bool:
+    """
+    Check that a string is a valid 24-hour "H:MM"/"HH:MM" time.
+    """
+    hours, sep, minutes = value.partition(":")
+    if not sep or not (1 <= len(hours) <= 2 and 1 <= len(minutes) <= 2):
+        return False
+    if not (hours.isascii() and hours.isdigit() and minutes.isascii() and minutes.isdigit()):
+        return False
+    return int(hours) < 24 and int(minutes) < 60
+
+
+def _parse_schedule(schedule: RelaySchedule) -> Tuple[int, int, int, bool]:
+    """
+    Parse a schedule into (on_minutes, off_minutes, days_mask, spans_midnight).
+    """
+    on_minutes = _hhmm_to_minutes(schedule.on_time or "00:00")
+    off_minutes = _hhmm_to_minutes(schedule.off_time or "23:59")
+    return on_minutes, off_minutes, schedule.days_mask, on_minutes > off_minutes
+
+
+_MINUTES_PER_DAY = 24 * 60
+
+
+def _build_week_table(schedule: RelaySchedule) -> bytes:
+    """
+    Precompute a schedule's ON/OFF state for every minute of the week.
+    
+    Args:
+        schedule (RelaySchedule): The relay's schedule configuration.
+        
+    Returns:
+        bytes: 7 * 1440 entries indexed by weekday() * 1440 + minute-of-day, 1 meaning ON.
+    """
+    table = bytearray(7 * _MINUTES_PER_DAY)
+    if not schedule.enabled:
+        return bytes(table)
+    
+    on_minutes, off_minutes, days_mask, spans_midnight = _parse_schedule(schedule)
+    for weekday, day_bit in enumerate(_WEEKDAY_BITS):
+        if not days_mask & day_bit:
+            continue
+        
+        start = weekday * _MINUTES_PER_DAY
+        if spans_midnight:
+            # Schedule spans midnight, e.g., 22:00 to 06:00
+            table[start:start + off_minutes] = b"\x01" * off_minutes
+            table[start + on_minutes:start + _MINUTES_PER_DAY] = b"\x01" * (_MINUTES_PER_DAY - on_minutes)
+        elif on_minutes < off_minutes:
+            # Regular schedule, e.g., 08:00 to 18:00
+            table[start + on_minutes:start + off_minutes] = b"\x01" * (off_minutes - on_minutes)
+    return bytes(table)
+
+
+def _next_table_change(table: bytes, now: datetime) -> Optional[Tuple[datetime, bool]]:
+    """
+    Find the next minute at which a week table changes state.
+    
+    Args:
+        table (bytes): A table built by _build_week_table.
+        now (datetime): The local time to search from.
+        
+    Returns:
+        Optional[Tuple[datetime, bool]]: When the state changes and the new state,
+        or None if the state never changes.
+    """
+    index = now.weekday() * _MINUTES_PER_DAY + now.hour * 60 + now.minute
+    flipped = b"\x00" if table[index] else b"\x01"
+    
+    # Search the rest of the week, then wrap around to its start
+    offset = table.find(flipped, index + 1)
+    if offset == -1:
+        offset = table.find(flipped, 0, index)
+        if offset == -1:
+            return None
+        offset += len(table)
+    
+    change_time = now.replace(second=0, microsecond=0) + timedelta(minutes=offset - index)
+    return change_time, flipped == b"\x01"
+
+
 class ScheduleManager:
     """
     Manages scheduling for all relays based on their configured schedules.
     """
+    __slots__ = (
+        "relays", "relay_manager", "_running", "_max_sleep",
+        "_verify_interval", "_last_verify", "_relay_states", "_events",
+        "_wakeup", "_schedule_tables",
+    )
+    
     def __init__(self, relays: List[RelayConfig], relay_manager):
         """
         Initialize the ScheduleManager.
@@ -44,65 +147,77 @@ class ScheduleManager:
         self.relays = relays
         self.relay_manager = relay_manager
         self._running = False
-        self._check_interval = 60  # Check schedules every minute
+        self._max_sleep = 900  # Re-sync with the wall clock at least every 15 minutes
+        self._verify_interval = 600  # Re-read hardware states every 10 minutes to catch drift
+        self._last_verify = time.monotonic()
         
         # Keep track of the last state we set for each relay
         self._relay_states: Dict[str, bool] = {}
+        
+        # Min-heap of upcoming (change_time, relay_id) events
+        self._events: List[Tuple[datetime, str]] = []
+        
+        # Set to wake the schedule loop early (shutdown, config changes)
+        self._wakeup = asyncio.Event()
+        
+        # Per-minute ON/OFF table per relay, rebuilt whenever the relay configs change
+        self._schedule_tables: Dict[str, bytes] = {}
+        self._build_schedule_cache()
+    
+    def _build_schedule_cache(self):
+        """
+        Precompute every relay schedule into a minute-of-week lookup table.
+        """
+        self._schedule_tables = {
+            relay.id: _build_week_table(relay.schedule)
+            for relay in self.relays
+            if isinstance(relay.schedule, RelaySchedule)
+        }
     
-    def _should_be_on(self, relay_id: str, schedule: RelaySchedule) -> bool:
+    def _should_be_on(self, relay_id: str, schedule: RelaySchedule, now: datetime) -> bool:
         """
-        Determine if a relay should be ON based on its schedule and the current time.
+        Determine if a relay should be ON based on its schedule and the given time.
         
         Args:
             relay_id (str): The relay identifier.
             schedule (RelaySchedule): The relay's schedule configuration.
+            now (datetime): The local time to evaluate the schedule at.
             
         Returns:
             bool: True if the relay should be ON, False otherwise.
         """
         # Check if scheduling is enabled
         if not schedule.enabled:
-            logger.debug(f"Relay {relay_id} schedule is disabled")
+            logger.debug("Relay %s schedule is disabled", relay_id)
             return False
         
-        # Get current time and day
-        now = datetime.now()
-        current_time = now.strftime("%H:%M")
-        
-        # Get current day name
-        day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        current_day_name = day_names[now.weekday()]
-        
-        # Get day bit value for current day
-        current_day_bit = DAY_VALUES.get(current_day_name, 0)
+        table = self._schedule_tables.get(relay_id)
+        if table is None:
+            table = _build_week_table(schedule)
         
-        # Check if the schedule is active for the current day
-        is_scheduled_today = (schedule.days_mask & current_day_bit) != 0
-        
-        if not is_scheduled_today:
-            logger.debug(f"Relay {relay_id} not scheduled for today ({current_day_name})")
-            return False
-        
-        # Check if current time is within the scheduled time range
-        on_time = schedule.on_time or "00:00"
-        off_time = schedule.off_time or "23:59"
-        
-        # Handle schedules that span midnight
-        if on_time > off_time:
-            # Schedule spans midnight, e.g., 22:00 to 06:00
-            return current_time >= on_time or current_time < off_time
-        else:
-            # Regular schedule, e.g., 08:00 to 18:00
-            return on_time <= current_time < off_time
+        return table[now.weekday() * _MINUTES_PER_DAY + now.hour * 60 + now.minute] == 1
     
-    async def _check_schedules(self):
+    async def _check_schedules(self, relay_ids: Optional[Set[str]] = None):
         """
-        Check all relay schedules and update relay states as needed.
+        Check relay schedules and update relay states as needed.
+        
+        Args:
+            relay_ids (Optional[Set[str]]): Only check these relays. Checks all relays if None.
         """
+        # Evaluate every relay against the same instant
+        now = datetime.now()
+        
+        # Relays whose desired state differs from the last state we set or saw
+        pending: List[Tuple[str, bool]] = []
+        
         for relay in self.relays:
             relay_id = relay.id
             schedule = relay.schedule
             
+            # Skip relays that weren't requested
+            if relay_ids is not None and relay_id not in relay_ids:
+                continue
+            
             # Skip if the relay is disabled
             if not relay.enabled:
                 continue
@@ -112,54 +227,153 @@ class ScheduleManager:
                 continue
             
             try:
-                should_be_on = self._should_be_on(relay_id, schedule)
-                
-                # Get the current state of the relay
-                current_state = await self.relay_manager.get_relay_state(relay_id)
-                
-                # Skip if we couldn't determine the current state
-                if current_state is None:
-                    logger.warning(f"Couldn't determine current state of relay {relay_id}")
-                    continue
-                
-                is_on = current_state == 1
-                
-                # Check if we already know the last state we set
-                last_state = self._relay_states.get(relay_id)
-                
-                # Only update the relay if:
-                # 1. The current state doesn't match what it should be, AND
-                # 2. We haven't already tried to set it to this state
-                if should_be_on != is_on and should_be_on != last_state:
-                    if should_be_on:
-                        logger.info(f"Schedule: Turning relay {relay_id} ON (current state: {'ON' if is_on else 'OFF'})")
-                        success = await self.relay_manager.set_relay_on(relay_id)
-                    else:
-                        logger.info(f"Schedule: Turning relay {relay_id} OFF (current state: {'ON' if is_on else 'OFF'})")
-                        success = await self.relay_manager.set_relay_off(relay_id)
-                    
-                    # Remember the state we just tried to set
-                    if success:
-                        self._relay_states[relay_id] = should_be_on
-                        logger.info(f"Successfully set relay {relay_id} to {'ON' if should_be_on else 'OFF'}")
-                    else:
-                        logger.error(f"Failed to set relay {relay_id} to {'ON' if should_be_on else 'OFF'}")
-                else:
-                    logger.debug(f"Relay {relay_id} already in correct state: {'ON' if is_on else 'OFF'}")
+                should_be_on = self._should_be_on(relay_id, schedule, now)
             except Exception as e:
-                logger.error(f"Error checking schedule for relay {relay_id}: {e}")
+                logger.error("Error checking schedule for relay %s: %s", relay_id, e)
+                continue
+            
+            if should_be_on != self._relay_states.get(relay_id):
+                pending.append((relay_id, should_be_on))
+        
+        if not pending:
+            return
+        
+        # Get the current state of every relay in one request
+        states = await self.relay_manager.get_all_relay_states()
+        
+        changes: List[Tuple[str, bool]] = []
+        for relay_id, should_be_on in pending:
+            current_state = states.get(relay_id)
+            
+            # Skip if we couldn't determine the current state
+            if current_state is None:
+                logger.warning("Couldn't determine current state of relay %s", relay_id)
+                continue
+            
+            is_on = current_state == 1
+            
+            # Only update the relay if the current state doesn't match what it should be
+            if should_be_on != is_on:
+                logger.info("Schedule: Turning relay %s %s (current state: %s)",
+                            relay_id, "ON" if should_be_on else "OFF", "ON" if is_on else "OFF")
+                changes.append((relay_id, should_be_on))
+            else:
+                # Remember the observed state so later checks can skip the query
+                self._relay_states[relay_id] = is_on
+                logger.debug("Relay %s already in correct state: %s", relay_id, "ON" if is_on else "OFF")
+        
+        if not changes:
+            return
+        
+        # Send all relay updates concurrently
+        results = await asyncio.gather(
+            *(
+                self.relay_manager.set_relay_on(relay_id) if should_be_on
+                else self.relay_manager.set_relay_off(relay_id)
+                for relay_id, should_be_on in changes
+            ),
+            return_exceptions=True,
+        )
+        
+        for (relay_id, should_be_on), success in zip(changes, results):
+            state = "ON" if should_be_on else "OFF"
+            if isinstance(success, Exception):
+                logger.error("Error setting relay %s to %s: %s", relay_id, state, success)
+            elif success:
+                # Remember the state we just set
+                self._relay_states[relay_id] = should_be_on
+                logger.info("Successfully set relay %s to %s", relay_id, state)
+            else:
+                logger.error("Failed to set relay %s to %s", relay_id, state)
+    
+    def _push_next_change(self, relay: RelayConfig):
+        """
+        Push the next scheduled state change for a relay onto the event heap.
+        
+        Args:
+            relay (RelayConfig): The relay configuration.
+        """
+        if not relay.enabled or not isinstance(relay.schedule, RelaySchedule):
+            return
+        
+        table = self._schedule_tables.get(relay.id)
+        if table is None:
+            table = _build_week_table(relay.schedule)
+        
+        # Use the same table _should_be_on reads so the wake-up matches the actual change
+        change = _next_table_change(table, datetime.now())
+        if change:
+            heapq.heappush(self._events, (change[0], relay.id))
+    
+    def _build_event_heap(self):
+        """
+        Rebuild the event heap from the current time for all relays.
+        """
+        self._events = []
+        for relay in self.relays:
+            self._push_next_change(relay)
+    
+    async def _full_check(self):
+        """
+        Check every relay and rebuild the event heap.
+        
+        Remembered relay states are dropped once per verify interval so relays
+        changed outside the scheduler are detected and corrected.
+        """
+        if time.monotonic() - self._last_verify >= self._verify_interval:
+            self._relay_states.clear()
+            self._last_verify = time.monotonic()
+        
+        await self._check_schedules()
+        self._build_event_heap()
     
     async def _schedule_loop(self):
         """
-        Main scheduling loop. Checks schedules periodically.
+        Main scheduling loop. Sleeps until the next scheduled state change.
         """
+        # Bring every relay in line with its schedule before waiting on events
+        await self._full_check()
+        
         while self._running:
             try:
-                # Check all schedules
-                await self._check_schedules()
+                # Sleep until the next change, capped so clock adjustments are picked up
+                timeout = self._max_sleep
+                if self._events:
+                    delta = (self._events[0][0] - datetime.now()).total_seconds()
+                    timeout = min(max(delta, 0), self._max_sleep)
+                
+                # Also wake for the next drift check
+                verify_in = self._last_verify + self._verify_interval - time.monotonic()
+                timeout = min(timeout, max(verify_in, 0))
+                
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                
+                if not self._running:
+                    break
                 
-                # Wait until the next check
-                await asyncio.sleep(self._check_interval)
+                # Woken early - re-check everything
+                if self._wakeup.is_set():
+                    self._wakeup.clear()
+                    await self._full_check()
+                    continue
+                
+                # Pop every relay whose change is due
+                now = datetime.now()
+                due = set()
+                while self._events and self._events[0][0] <= now:
+                    due.add(heapq.heappop(self._events)[1])
+                
+                if due:
+                    await self._check_schedules(due)
+                    for relay in self.relays:
+                        if relay.id in due:
+                            self._push_next_change(relay)
+                else:
+                    # Nothing due (sleep cap, drift check or clock moved); re-sync with the wall clock
+                    await self._full_check()
             except asyncio.CancelledError:
                 logger.info("Schedule loop cancelled")
                 break
@@ -179,16 +393,16 @@ class ScheduleManager:
         all_valid = True
         for relay in self.relays:
             if not relay.enabled:
-                logger.debug(f"Relay '{relay.id}' is disabled, skipping schedule verification")
+                logger.debug("Relay '%s' is disabled, skipping schedule verification", relay.id)
                 continue
                 
             schedule = relay.schedule
             if not isinstance(schedule, RelaySchedule):
-                logger.debug(f"Relay '{relay.id}' has no schedule configuration")
+                logger.debug("Relay '%s' has no schedule configuration", relay.id)
                 continue
                 
             if not schedule.enabled:
-                logger.debug(f"Schedule for relay '{relay.id}' is disabled")
+                logger.debug("Schedule for relay '%s' is disabled", relay.id)
                 continue
                 
             try:
@@ -196,31 +410,27 @@ class ScheduleManager:
                 on_time_valid = True
                 off_time_valid = True
                 
-                if schedule.on_time:
-                    try:
-                        datetime.strptime(schedule.on_time, "%H:%M")
-                    except ValueError:
-                        on_time_valid = False
-                        logger.error(f"Relay '{relay.id}' has invalid on_time format: {schedule.on_time}")
+                if schedule.on_time and not _is_valid_hhmm(schedule.on_time):
+                    on_time_valid = False
+                    logger.error("Relay '%s' has invalid on_time format: %s", relay.id, schedule.on_time)
                         
-                if schedule.off_time:
-                    try:
-                        datetime.strptime(schedule.off_time, "%H:%M")
-                    except ValueError:
-                        off_time_valid = False
-                        logger.error(f"Relay '{relay.id}' has invalid off_time format: {schedule.off_time}")
+                if schedule.off_time and not _is_valid_hhmm(schedule.off_time):
+                    off_time_valid = False
+                    logger.error("Relay '%s' has invalid off_time format: %s", relay.id, schedule.off_time)
                         
                 # Verify days mask
                 days_mask_valid = 0 <= schedule.days_mask <= 255  # Updated max value to include all possible days
                 if not days_mask_valid:
-                    logger.error(f"Relay '{relay.id}' has invalid days_mask: {schedule.days_mask}")
+                    logger.error("Relay '%s' has invalid days_mask: %s", relay.id, schedule.days_mask)
                     
                 schedule_valid = on_time_valid and off_time_valid and days_mask_valid
-                if schedule_valid:
-                    days = days_mask_to_names(schedule.days_mask)
-                    logger.info(f"Schedule for relay '{relay.id}' is valid - "
-                              f"On: {schedule.on_time}, Off: {schedule.off_time}, "
-                              f"Days: {', '.join(days)}")
+                if not schedule_valid:
+                    all_valid = False
+                elif logger.isEnabledFor(logging.INFO):
+                    # The summary below is informational only, so skip building it when it won't be logged
+                    logger.info("Schedule for relay '%s' is valid - On: %s, Off: %s, Days: %s",
+                                relay.id, schedule.on_time, schedule.off_time,
+                                ", ".join(days_mask_to_names(schedule.days_mask)))
                     
                     # Calculate next schedule change to verify logic
                     next_change = next_schedule_change(schedule)
@@ -231,15 +441,13 @@ class ScheduleManager:
                         when = "today" if days_away == 0 else (
                             "tomorrow" if days_away == 1 else f"in {days_away} days"
                         )
-                        logger.info(f"Relay '{relay.id}' next scheduled change: {state} at "
-                                  f"{change_time.strftime('%H:%M')} {when}")
+                        logger.info("Relay '%s' next scheduled change: %s at %02d:%02d %s",
+                                    relay.id, state, change_time.hour, change_time.minute, when)
                     else:
-                        logger.warning(f"No upcoming schedule changes for relay '{relay.id}'")
-                else:
-                    all_valid = False
+                        logger.warning("No upcoming schedule changes for relay '%s'", relay.id)
                     
             except Exception as e:
-                logger.error(f"Error verifying schedule for relay '{relay.id}': {e}")
+                logger.error("Error verifying schedule for relay '%s': %s", relay.id, e)
                 all_valid = False
                 
         return all_valid
@@ -269,6 +477,23 @@ class ScheduleManager:
             self._running = False
             logger.info("Schedule manager stopped")
     
+    def reload(self, relays: Optional[List[RelayConfig]] = None):
+        """
+        Apply updated relay configurations and wake the schedule loop so they take effect immediately.
+        
+        Args:
+            relays (Optional[List[RelayConfig]]): New relay configurations. Keeps the current list if None.
+        """
+        if relays is not None:
+            self.relays = relays
+        
+        self._build_schedule_cache()
+        
+        # Forget remembered states so every relay is verified against its new schedule
+        self._relay_states.clear()
+        self._wakeup.set()
+        logger.info("Schedule configuration reloaded")
+    
     async def shutdown(self):
         """
         Shut down the schedule manager.
@@ -277,9 +502,17 @@ class ScheduleManager:
             return
         
         self._running = False
+        self._wakeup.set()
         logger.info("Shutting down schedule manager")
 
 
+# Day names for every possible days_mask value (bits 1-7 carry the days)
+_MASK_TO_NAMES = tuple(
+    tuple(day for day, bit_value in DAY_VALUES.items() if mask & bit_value)
+    for mask in range(256)
+)
+
+
 # Helper function to convert days_mask to a list of day names
 def days_mask_to_names(days_mask: int) -> List[str]:
     """
@@ -291,13 +524,15 @@ def days_mask_to_names(days_mask: int) -> List[str]:
     Returns:
         List[str]: List of day names.
     """
-    result = []
-    
-    for day, bit_value in DAY_VALUES.items():
-        if (days_mask & bit_value) != 0:
-            result.append(day)
-            
-    return result
+    return list(_MASK_TO_NAMES[days_mask & 0xFF])
+
+
+@functools.lru_cache(maxsize=64)
+def _day_name_to_bit(day: str) -> int:
+    """
+    Look up the bit value for a day name, ignoring case.
+    """
+    return DAY_VALUES.get(day.title(), 0)
 
 
 # Helper function to convert a list of day names to a days_mask
@@ -313,13 +548,18 @@ def day_names_to_mask(day_names: List[str]) -> int:
     """
     days_mask = 0
     for day in day_names:
-        day_title = day.title()  # Convert to title case for matching
-        if day_title in DAY_VALUES:
-            days_mask |= DAY_VALUES[day_title]
+        days_mask |= _day_name_to_bit(day)
     
     return days_mask
 
 
+def _schedule_change(time: datetime, state: bool, days_away: int) -> Dict[str, Any]:
+    """
+    Build the result dictionary returned by next_schedule_change.
+    """
+    return {"time": time, "state": state, "days_away": days_away}
+
+
 # Helper function to calculate the next schedule change
 def next_schedule_change(schedule: RelaySchedule) -> Optional[Dict[str, Any]]:
     """
@@ -335,87 +575,9 @@ def next_schedule_change(schedule: RelaySchedule) -> Optional[Dict[str, Any]]:
         return None
     
     now = datetime.now()
-    current_time = now.strftime("%H:%M")
-    
-    # Get current day name
-    day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    current_day_index = now.weekday()
-    current_day_name = day_names[current_day_index]
-    
-    on_time = schedule.on_time or "00:00"
-    off_time = schedule.off_time or "23:59"
-    
-    # Convert times to datetime objects for comparison
-    on_time_parts = list(map(int, on_time.split(":")))
-    off_time_parts = list(map(int, off_time.split(":")))
-    
-    on_datetime = now.replace(hour=on_time_parts[0], minute=on_time_parts[1], second=0, microsecond=0)
-    off_datetime = now.replace(hour=off_time_parts[0], minute=off_time_parts[1], second=0, microsecond=0)
-    
-    # Check if today's schedule is active
-    current_day_bit = DAY_VALUES.get(current_day_name, 0)
-    is_scheduled_today = (schedule.days_mask & current_day_bit) != 0
-    
-    # Handle schedules that span midnight
-    if on_time > off_time:
-        # If it's currently after off_time but before on_time, and today is scheduled
-        if current_time < on_time and current_time >= off_time and is_scheduled_today:
-            return {
-                "time": on_datetime,
-                "state": True,  # ON
-                "days_away": 0
-            }
-        
-        # If it's before off_time and today is scheduled
-        if current_time < off_time and is_scheduled_today:
-            return {
-                "time": off_datetime,
-                "state": False,  # OFF
-                "days_away": 0
-            }
-        
-        # If it's after on_time and today is scheduled
-        if current_time >= on_time and is_scheduled_today:
-            # The next change would be OFF time tomorrow
-            return {
-                "time": off_datetime + timedelta(days=1),
-                "state": False,  # OFF
-                "days_away": 1
-            }
-    else:
-        # Regular schedule (doesn't span midnight)
-        
-        # If it's before on_time and today is scheduled
-        if current_time < on_time and is_scheduled_today:
-            return {
-                "time": on_datetime,
-                "state": True,  # ON
-                "days_away": 0
-            }
-            
-        # If it's before off_time but after on_time and today is scheduled
-        if current_time < off_time and current_time >= on_time and is_scheduled_today:
-            return {
-                "time": off_datetime,
-                "state": False,  # OFF
-                "days_away": 0
-            }
-    
-    # If we reach here, we need to find the next scheduled day
-    for days_ahead in range(1, 8):  # Check up to 7 days ahead
-        next_day_index = (current_day_index + days_ahead) % 7
-        next_day_name = day_names[next_day_index]
-        next_day_bit = DAY_VALUES.get(next_day_name, 0)
-        
-        # Check if this day is scheduled
-        if (schedule.days_mask & next_day_bit) != 0:
-            # This day is scheduled, so the next change will be the ON time
-            next_on_datetime = on_datetime + timedelta(days=days_ahead)
-            return {
-                "time": next_on_datetime,
-                "state": True,  # ON
-                "days_away": days_ahead
-            }
+    change = _next_table_change(_build_week_table(schedule), now)
+    if change is None:
+        return None
     
-    # If no schedule found, return None
-    return None
\ No newline at end of file
+    change_time, state = change
+    return _schedule_change(change_time, state, (change_time.date() - now.date()).days)
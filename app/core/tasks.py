@@ -4,9 +4,9 @@ Task Manager for handling automated tasks and rules.
 This module processes data from sensors and executes actions based on configured rules.
 """
 import asyncio
+import operator
 import os
-import subprocess
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, FrozenSet, List, Any, Optional, Tuple
 import logging
 from app.utils.validator import Task, TaskAction
 from app.system.relay import RelayManager
@@ -18,10 +18,28 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# Comparison functions for each supported condition operator
+_OPS = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# Precomputed (task_id, task, field, compare, threshold) entry for one task
+_Condition = Tuple[str, Task, str, Callable[[float, float], bool], float]
+
 class TaskManager:
     """
     Manages all automated tasks and rules in the system.
     """
+    __slots__ = (
+        "tasks", "relay_manager", "task_states", "source_to_tasks",
+        "source_fields", "_running", "_stop",
+    )
+    
     def __init__(self, tasks: Dict[str, Task], relay_manager: RelayManager):
         """
         Initialize the TaskManager.
@@ -36,15 +54,28 @@ class TaskManager:
         # Track task/rule states (triggered or not)
         self.task_states: Dict[str, bool] = {task_id: False for task_id in tasks}
         
-        # Create a mapping from sources to task IDs for quicker lookup
-        self.source_to_tasks: Dict[str, List[str]] = {}
+        # Create a mapping from sources to their task conditions for quicker lookup
+        self.source_to_tasks: Dict[str, Tuple[_Condition, ...]] = {}
+        conditions: Dict[str, List[_Condition]] = {}
         for task_id, task in tasks.items():
-            source = task.source
-            if source not in self.source_to_tasks:
-                self.source_to_tasks[source] = []
-            self.source_to_tasks[source].append(task_id)
+            op = _OPS.get(task.operator)
+            if op is None:
+                logger.error(f"Unknown operator '{task.operator}' for task '{task.name}' ({task_id}), task disabled")
+                continue
+            conditions.setdefault(task.source, []).append((task_id, task, task.field, op, task.value))
+        for source, entries in conditions.items():
+            self.source_to_tasks[source] = tuple(entries)
+        
+        # Fields each source's tasks need, so missing fields are found once per data point
+        self.source_fields: Dict[str, FrozenSet[str]] = {
+            source: frozenset(field for _, _, field, _, _ in entries)
+            for source, entries in self.source_to_tasks.items()
+        }
         
         self._running = False
+        
+        # Set by shutdown() to release run()
+        self._stop = asyncio.Event()
     
     async def evaluate_data(self, source: str, data: Dict[str, float]):
         """
@@ -55,67 +86,49 @@ class TaskManager:
             data (Dict[str, float]): The data point (e.g., {"volts": 12.3, "amps": 0.5}).
         """
         # Skip if no tasks for this source
-        if source not in self.source_to_tasks:
+        entries = self.source_to_tasks.get(source)
+        if not entries:
             return
         
-        task_ids = self.source_to_tasks[source]
-        logger.debug(f"Evaluating {len(task_ids)} tasks for source {source}")
+        logger.debug("Evaluating %d tasks for source %s", len(entries), source)
         
-        for task_id in task_ids:
-            task = self.tasks.get(task_id)
-            if not task:
-                continue
-            
+        # Check the required fields once rather than per task
+        missing = self.source_fields[source].difference(data)
+        if missing:
+            logger.debug("Fields %s not in data for source %s", sorted(missing), source)
+        
+        # Evaluate every task first, collecting only the state transitions in task order
+        transitions: List[Tuple[str, Task, bool]] = []
+        for task_id, task, field, op, threshold in entries:
             # Skip if the field doesn't exist in the data
-            if task.field not in data:
-                logger.debug(f"Field '{task.field}' not in data for task '{task.name}' ({task_id})")
+            if missing and field in missing:
                 continue
             
             # Evaluate the condition
-            condition_met = self._evaluate_condition(data[task.field], task.operator, task.value)
+            condition_met = op(data[field], threshold)
             previously_triggered = self.task_states.get(task_id, False)
             
-            logger.debug(f"Task '{task.name}' ({task_id}): condition_met={condition_met}, previously_triggered={previously_triggered}")
+            logger.debug("Task '%s' (%s): %s %s %s -> condition_met=%s, previously_triggered=%s",
+                         task.name, task_id, data[field], task.operator, threshold,
+                         condition_met, previously_triggered)
             
-            # Handle state changes
+            # Record state changes
             if condition_met and not previously_triggered:
                 # NOT TRIGGERED -> TRIGGERED (alert_start)
                 self.task_states[task_id] = True
-                await self._handle_task_triggered(task_id, task, data)
+                transitions.append((task_id, task, True))
             elif not condition_met and previously_triggered:
                 # TRIGGERED -> NOT TRIGGERED (alert_clear)
                 self.task_states[task_id] = False
-                await self._handle_task_cleared(task_id, task, data)
-    
-    def _evaluate_condition(self, value: float, operator: str, threshold: float) -> bool:
-        """
-        Evaluate a condition based on the operator and threshold.
+                transitions.append((task_id, task, False))
         
-        Args:
-            value (float): The measured value.
-            operator (str): The comparison operator ('>', '<', '>=', '<=', '==', '!=').
-            threshold (float): The threshold value to compare against.
-            
-        Returns:
-            bool: True if the condition is met, False otherwise.
-        """
-        logger.debug(f"Evaluating condition: {value} {operator} {threshold}")
-        
-        if operator == '>':
-            return value > threshold
-        elif operator == '<':
-            return value < threshold
-        elif operator == '>=':
-            return value >= threshold
-        elif operator == '<=':
-            return value <= threshold
-        elif operator == '==':
-            return value == threshold
-        elif operator == '!=':
-            return value != threshold
-        else:
-            logger.error(f"Unknown operator: {operator}")
-            return False
+        # Dispatch only the tasks whose state changed, in the same order as before
+        # so actions of tasks sharing a relay apply in task order
+        for task_id, task, is_triggered in transitions:
+            if is_triggered:
+                await self._handle_task_triggered(task_id, task, data)
+            else:
+                await self._handle_task_cleared(task_id, task, data)
     
     async def _handle_task_triggered(self, task_id: str, task: Task, data: Dict[str, float]):
         """
@@ -128,9 +141,55 @@ class TaskManager:
         """
         logger.info(f"Task '{task.name}' ({task_id}) triggered")
         
-        # Execute all actions for this task
-        for action in task.actions:
-            await self._execute_action(action, task, data)
+        # Execute the actions in their configured order, overlapping only runs
+        # of actions that cannot affect each other
+        for batch in self._action_batches(task.actions):
+            if len(batch) == 1:
+                await self._execute_action(batch[0], task, data)
+                continue
+            
+            results = await asyncio.gather(
+                *(self._execute_action(action, task, data) for action in batch),
+                return_exceptions=True,
+            )
+            for action, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error executing {action.type} action for task '{task.name}': {result}")
+    
+    @staticmethod
+    def _action_batches(actions: List[TaskAction]) -> List[List[TaskAction]]:
+        """
+        Split a task's actions into consecutive batches that are safe to run concurrently.
+        
+        A batch never holds two IO actions on the same relay, and a reboot always
+        runs alone after every action before it.
+        
+        Args:
+            actions (List[TaskAction]): The task's actions in configured order.
+            
+        Returns:
+            List[List[TaskAction]]: The batches, to be run one after another.
+        """
+        batches: List[List[TaskAction]] = []
+        batch: List[TaskAction] = []
+        targets = set()
+        for action in actions:
+            is_reboot = action.type == "reboot"
+            if batch and (is_reboot or (action.type == "io" and action.target in targets)):
+                batches.append(batch)
+                batch, targets = [], set()
+            
+            if is_reboot:
+                batches.append([action])
+                continue
+            
+            batch.append(action)
+            if action.type == "io":
+                targets.add(action.target)
+        
+        if batch:
+            batches.append(batch)
+        return batches
     
     async def _handle_task_cleared(self, task_id: str, task: Task, data: Dict[str, float]):
         """
@@ -227,7 +286,14 @@ class TaskManager:
         logger.warning(f"System will reboot in {delay} seconds")
         await asyncio.sleep(delay)
         try:
-            subprocess.run(["sudo", "reboot"])
+            proc = await asyncio.create_subprocess_exec(
+                "sudo", "reboot",
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
+            )
+            _, stderr = await proc.communicate()
+            if proc.returncode != 0:
+                logger.error(f"Reboot command failed ({proc.returncode}): {stderr.decode().strip()}")
         except Exception as e:
             logger.error(f"Failed to reboot system: {e}")
     
@@ -235,7 +301,7 @@ class TaskManager:
         """
         Start the task manager.
         
-        Note: This method doesn't do much - it just sleeps for a long time.
+        Note: This method doesn't do much - it just waits until shutdown.
         Tasks are evaluated when data is received via the evaluate_data method.
         """
         if self._running:
@@ -243,14 +309,13 @@ class TaskManager:
             return
         
         self._running = True
+        self._stop.clear()
         logger.info(f"Task manager started with {len(self.tasks)} tasks")
         
         # This implementation doesn't have a main loop since tasks are evaluated on-demand
         # when data is received. We just need to keep the run() method alive.
         try:
-            while self._running:
-                await asyncio.sleep(60)  # Sleep for a minute
-                logger.debug("Task manager running...")
+            await self._stop.wait()
         except asyncio.CancelledError:
             logger.info("Task manager cancelled")
             raise
@@ -267,4 +332,5 @@ class TaskManager:
             return
         
         self._running = False
+        self._stop.set()
         logger.info("Shutting down task manager")
\ No newline at end of file
@@ -5,11 +5,11 @@ This module handles collecting data from various sensors and streams the data
 to the appropriate destinations (Redis, InfluxDB, AWS, etc.).
 """
 import asyncio
-import time
 from datetime import datetime, timezone
-from typing import Dict, List, Any, Optional, Set
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
 import logging
 from app.utils.validator import Config
+from app.utils.config import settings
 from services.smbus import INA260Sensor, SHT30Sensor
 from app.core.tasks import TaskManager
 from app.data.network_collectors import NetworkDataCollector
@@ -24,12 +24,25 @@ logger.addHandler(handler)
 
 # Try to import Redis - it's optional
 try:
-    from redis.asyncio import Redis
+    from redis.asyncio import ConnectionPool, Redis
     REDIS_AVAILABLE = True
 except ImportError:
     REDIS_AVAILABLE = False
     logger.warning("Redis not available. Data will not be stored in Redis.")
 
+# Redis stream key for environmental readings
+ENV_STREAM_KEY = b"environmental"
+
+# Redis connections: the stream flusher plus a little headroom for concurrent callers
+REDIS_MAX_CONNECTIONS = 8
+
+
+def _stream_timestamp() -> str:
+    """
+    UTC ISO-8601 timestamp for stream entries, at the one-second resolution of collection.
+    """
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
 class DataCollectionManager:
     """
     Manages data collection from various sensors and metrics.
@@ -44,22 +57,36 @@ class DataCollectionManager:
         """
         self.config = config
         self.task_manager = task_manager
+        self._relay_ids = frozenset(relay.id for relay in config.relays)
         self.redis = None
         self._running = False
         self._collection_interval = 5  # Collect data every 3 seconds
+        self._network_interval = 60  # Collect network metrics every minute
+        
+        # Set by shutdown() to end collection waits immediately
+        self._stop_event = asyncio.Event()
         
         # Track what sensors are available
         self.ina260_sensors: Dict[str, INA260Sensor] = {}
         self.sht30_sensor: Optional[SHT30Sensor] = None
         
+        # Per-relay values built once at sensor initialization and reused every tick
+        self._relay_stream_keys: Dict[str, bytes] = {}
+        self._relay_tags: Dict[str, Dict[str, str]] = {}
+        self._relay_eval_data: Dict[str, Dict[str, float]] = {}
+        
         # Network data collector
-        self.network_collector = NetworkDataCollector()
+        self.network_collector = NetworkDataCollector(targets=settings.PING_TARGETS)
         
         # InfluxDB Uploader
         self.influx_uploader = InfluxUploader()
         
         # Track collection tasks
         self.collection_tasks = []
+        
+        # Redis stream entries waiting for the background flusher, written in pipelines
+        self._stream_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.STREAM_QUEUE_SIZE)
+        self._stream_batch_size = settings.STREAM_BATCH_SIZE
     
     async def initialize(self) -> bool:
         """
@@ -74,7 +101,13 @@ class DataCollectionManager:
                 try:
                     import os
                     redis_url = os.environ.get('REDIS_URL', 'redis://redis:6379/0')
-                    self.redis = Redis.from_url(redis_url)
+                    pool = ConnectionPool.from_url(
+                        redis_url,
+                        max_connections=REDIS_MAX_CONNECTIONS,
+                        socket_keepalive=True
+                    )
+                    # from_pool hands pool ownership to the client so close() releases it
+                    self.redis = Redis.from_pool(pool)
                     await self.redis.ping()
                     logger.info(f"Redis connection established to {redis_url}")
                 except Exception as e:
@@ -110,12 +143,15 @@ class DataCollectionManager:
                 address = int(sensor_config["address"], 16)
                 
                 # Skip if relay is not in our config
-                if relay_id != "main" and not any(r.id == relay_id for r in self.config.relays):
+                if relay_id != "main" and relay_id not in self._relay_ids:
                     continue
                 
                 # Create sensor
                 sensor = INA260Sensor(address=address)
                 self.ina260_sensors[relay_id] = sensor
+                self._relay_stream_keys[relay_id] = relay_id.encode()
+                self._relay_tags[relay_id] = {"relay_id": relay_id}
+                self._relay_eval_data[relay_id] = {"volts": 0.0, "amps": 0.0, "watts": 0.0}
                 logger.debug(f"Initialized INA260 sensor for {relay_id}")
             except Exception as e:
                 logger.error(f"Failed to initialize INA260 sensor for {sensor_config['id']}: {e}")
@@ -129,68 +165,127 @@ class DataCollectionManager:
             logger.error(f"Failed to initialize SHT30 sensor: {e}")
             self.sht30_sensor = None
     
-    async def _collect_relay_data(self, relay_id: str, sensor: INA260Sensor):
+    async def _wait_next_tick(self, deadline: float, interval: float) -> float:
         """
-        Collect data from a relay's INA260 sensor.
+        Sleep until the next collection tick, keeping ticks on a fixed cadence.
+        Returns early once shutdown() has been called.
+        
+        Args:
+            deadline (float): The event loop time of the tick that just ran.
+            interval (float): Seconds between ticks.
+            
+        Returns:
+            float: The event loop time of the next tick.
+        """
+        loop = asyncio.get_running_loop()
+        deadline += interval
+        delay = deadline - loop.time()
+        if delay < 0:
+            # Fell more than a tick behind; re-align rather than running back-to-back ticks
+            deadline = loop.time()
+            delay = 0
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+        return deadline
+    
+    async def _read_relay_sensor(self, relay_id: str, sensor: INA260Sensor) -> Optional[Tuple[float, float, float]]:
+        """
+        Read voltage, current and power from a relay's INA260 sensor.
         
         Args:
             relay_id (str): The relay identifier.
             sensor (INA260Sensor): The relay's INA260 sensor.
+            
+        Returns:
+            Optional[Tuple[float, float, float]]: (voltage, current, power), or None if any reading failed.
         """
+        reading = await sensor.read_all()
+        
+        # Skip if the reading failed
+        if reading is None:
+            logger.warning("Incomplete sensor readings for %s", relay_id)
+        return reading
+    
+    async def _collect_relay_data(self):
+        """
+        Collect data from every relay's INA260 sensor, one tick for all sensors.
+        """
+        deadline = asyncio.get_running_loop().time()
         while self._running:
             try:
-                # Read voltage, current, and power
-                voltage = await sensor.read_voltage()
-                current = await sensor.read_current()
-                power = await sensor.read_power()
-                
-                # Skip if any reading failed
-                if voltage is None or current is None or power is None:
-                    logger.warning(f"Incomplete sensor readings for {relay_id}")
-                    await asyncio.sleep(self._collection_interval)
-                    continue
+                # Read all sensors for this tick
+                sensors = list(self.ina260_sensors.items())
+                readings = await asyncio.gather(
+                    *(self._read_relay_sensor(relay_id, sensor) for relay_id, sensor in sensors),
+                    return_exceptions=True
+                )
                 
-                # Stream to Redis if available
-                if self.redis:
+                timestamp = _stream_timestamp().encode()
+                influx_readings = []
+                for (relay_id, _), reading in zip(sensors, readings):
+                    if isinstance(reading, Exception):
+                        logger.error("Error collecting data for %s: %s", relay_id, reading)
+                        continue
+                    if reading is None:
+                        continue
+                    
+                    voltage, current, power = reading
+                    influx_readings.append((
+                        "relay_power",
+                        self._relay_tags[relay_id],
+                        {"voltage": voltage, "current": current, "power": power}
+                    ))
+                    
                     try:
-                        data = {
-                            "volts": voltage,
-                            "amps": current,
-                            "watts": power,
-                            "timestamp": datetime.now(timezone.utc).isoformat()
-                        }
-                        await self.redis.xadd(relay_id, data)
+                        await self._process_relay_reading(relay_id, reading, timestamp)
                     except Exception as e:
-                        logger.error(f"Failed to stream data to Redis: {e}")
-                
-                # Upload to InfluxDB
-                await self.influx_uploader.upload_sensor_data(
-                    measurement="relay_power",
-                    tags={"relay_id": relay_id},
-                    fields={
-                        "voltage": voltage,
-                        "current": current,
-                        "power": power
-                    }
-                )
-                
-                # Send to task manager for evaluation
-                if self.task_manager:
-                    eval_data = {
-                        "volts": voltage,
-                        "amps": current,
-                        "watts": power
-                    }
-                    await self.task_manager.evaluate_data(relay_id, eval_data)
+                        logger.error("Error collecting data for %s: %s", relay_id, e)
                 
-                # Log periodically
-                logger.debug(f"Relay {relay_id} readings: {voltage:.2f}V, {current:.3f}A, {power:.2f}W")
+                # Hand the whole tick to the InfluxDB uploader at once
+                await self.influx_uploader.upload_sensor_data_batch(influx_readings)
                 
             except Exception as e:
-                logger.error(f"Error collecting data for {relay_id}: {e}")
+                logger.error(f"Error collecting relay data: {e}")
             
             # Wait until next collection
-            await asyncio.sleep(self._collection_interval)
+            deadline = await self._wait_next_tick(deadline, self._collection_interval)
+    
+    async def _process_relay_reading(self, relay_id: str, reading: Tuple[float, float, float], timestamp: bytes):
+        """
+        Stream and evaluate a single relay reading.
+        
+        Args:
+            relay_id (str): The relay identifier.
+            reading (Tuple[float, float, float]): (voltage, current, power).
+            timestamp (bytes): Encoded stream timestamp shared by the collection tick.
+        """
+        voltage, current, power = reading
+        
+        # Queue for Redis if available; the flusher writes the tick in one pipeline
+        if self.redis:
+            # Keys and values are pre-encoded so redis-py passes them through unchanged;
+            # %r gives the same text redis-py would produce for a float
+            data = {
+                b"volts": b"%r" % voltage,
+                b"amps": b"%r" % current,
+                b"watts": b"%r" % power,
+                b"timestamp": timestamp
+            }
+            self._queue_stream_entry(self._relay_stream_keys[relay_id], data)
+        
+        # Send to task manager for evaluation
+        if self.task_manager:
+            # Reuse the relay's evaluation dict; it is only read during evaluate_data
+            eval_data = self._relay_eval_data[relay_id]
+            eval_data["volts"] = voltage
+            eval_data["amps"] = current
+            eval_data["watts"] = power
+            await self.task_manager.evaluate_data(relay_id, eval_data)
+        
+        # Log periodically
+        logger.debug("Relay %s readings: %.2fV, %.3fA, %.2fW", relay_id, voltage, current, power)
     
     async def _collect_environmental_data(self):
         """
@@ -200,6 +295,7 @@ class DataCollectionManager:
             logger.warning("No SHT30 sensor available, skipping environmental data collection")
             return
         
+        deadline = asyncio.get_running_loop().time()
         while self._running:
             try:
                 # Read temperature and humidity
@@ -209,52 +305,118 @@ class DataCollectionManager:
                 # Skip if any reading failed
                 if temperature is None or humidity is None:
                     logger.warning("Incomplete environmental sensor readings")
-                    await asyncio.sleep(self._collection_interval)
-                    continue
-                
-                # Stream to Redis if available
-                if self.redis:
-                    try:
-                        data = {
-                            "temperature": temperature,
-                            "humidity": humidity,
-                            "timestamp": datetime.now(timezone.utc).isoformat()
-                        }
-                        await self.redis.xadd("environmental", data)
-                    except Exception as e:
-                        logger.error(f"Failed to stream environmental data to Redis: {e}")
-                
-                # Upload to InfluxDB
-                await self.influx_uploader.upload_sensor_data(
-                    measurement="environmental",
-                    tags={},
-                    fields={
-                        "temperature": temperature,
-                        "humidity": humidity
-                    }
-                )
-                
-                # Send to task manager for evaluation
-                if self.task_manager:
-                    eval_data = {
-                        "temperature": temperature,
-                        "humidity": humidity
-                    }
-                    await self.task_manager.evaluate_data("environmental", eval_data)
-                
-                # Log periodically
-                logger.debug(f"Environmental readings: {temperature:.1f}°F, {humidity:.1f}%")
+                else:
+                    await self._process_environmental_reading(temperature, humidity)
                 
             except Exception as e:
                 logger.error(f"Error collecting environmental data: {e}")
             
             # Wait until next collection
-            await asyncio.sleep(self._collection_interval * 2)  # Collect less frequently
+            deadline = await self._wait_next_tick(deadline, self._collection_interval * 2)  # Collect less frequently
+    
+    async def _process_environmental_reading(self, temperature: float, humidity: float):
+        """
+        Stream, upload and evaluate a single environmental reading.
+        
+        Args:
+            temperature (float): Temperature in °F.
+            humidity (float): Relative humidity in %.
+        """
+        # Queue for Redis if available
+        if self.redis:
+            # Keys and values are pre-encoded so redis-py passes them through unchanged
+            data = {
+                b"temperature": b"%r" % temperature,
+                b"humidity": b"%r" % humidity,
+                b"timestamp": _stream_timestamp().encode()
+            }
+            self._queue_stream_entry(ENV_STREAM_KEY, data)
+        
+        # Upload to InfluxDB
+        await self.influx_uploader.upload_sensor_data(
+            measurement="environmental",
+            tags={},
+            fields={
+                "temperature": temperature,
+                "humidity": humidity
+            }
+        )
+        
+        # Send to task manager for evaluation
+        if self.task_manager:
+            eval_data = {
+                "temperature": temperature,
+                "humidity": humidity
+            }
+            await self.task_manager.evaluate_data("environmental", eval_data)
+        
+        # Log periodically
+        logger.debug("Environmental readings: %.1f°F, %.1f%%", temperature, humidity)
+    
+    def _queue_stream_entry(self, stream: Union[str, bytes], data: Dict[Any, Any]):
+        """
+        Queue a Redis stream entry for the background flusher without waiting on Redis.
+        
+        Args:
+            stream (Union[str, bytes]): The Redis stream key.
+            data (Dict[Any, Any]): The stream entry fields.
+        """
+        try:
+            self._stream_queue.put_nowait((stream, data))
+        except asyncio.QueueFull:
+            logger.warning("Redis stream queue full, dropping entry for %r", stream)
+    
+    def _drain_stream_queue(self, limit: int) -> List[tuple]:
+        """
+        Take up to limit queued stream entries without waiting.
+        """
+        entries = []
+        while len(entries) < limit:
+            try:
+                entries.append(self._stream_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return entries
+    
+    async def _write_streams(self, entries: List[tuple]):
+        """
+        Write stream entries to Redis in a single pipeline.
+        
+        Args:
+            entries (List[tuple]): (stream, data) pairs to write.
+        """
+        if not entries or not self.redis:
+            return
+        
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for stream, data in entries:
+                    pipe.xadd(stream, data)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to flush {len(entries)} stream entries to Redis: {e}")
+    
+    async def _flush_streams(self):
+        """
+        Write every queued stream entry to Redis.
+        """
+        while not self._stream_queue.empty():
+            await self._write_streams(self._drain_stream_queue(self._stream_batch_size))
+    
+    async def _stream_flusher(self):
+        """
+        Write queued stream entries to Redis as they arrive, batching whatever is pending.
+        """
+        while self._running:
+            entry = await self._stream_queue.get()
+            entries = [entry] + self._drain_stream_queue(self._stream_batch_size - 1)
+            await self._write_streams(entries)
     
     async def _collect_network_data(self):
         """
         Collect network performance metrics.
         """
+        deadline = asyncio.get_running_loop().time()
         while self._running:
             try:
                 # Collect network metrics via the network collector
@@ -266,28 +428,67 @@ class DataCollectionManager:
                 # Skip if no valid metrics
                 if not any(metrics.values()):
                     logger.warning("No valid network metrics")
-                    await asyncio.sleep(60)
-                    continue
-                
-                # Upload to InfluxDB
-                await self.influx_uploader.upload_sensor_data(
-                    measurement="network_performance",
-                    tags={},
-                    fields={
-                        k: v for k, v in metrics.items() 
-                        if v is not None
-                    }
-                )
-                
-                # Log metrics
-                logger.debug(f"Network metrics: {metrics}")
+                else:
+                    # Upload to InfluxDB
+                    await self.influx_uploader.upload_sensor_data(
+                        measurement="network_performance",
+                        tags={},
+                        fields={
+                            k: v for k, v in metrics.items() 
+                            if v is not None
+                        }
+                    )
+                    
+                    # Log metrics
+                    logger.debug("Network metrics: %s", metrics)
                 
-                # Wait until next collection
-                await asyncio.sleep(60)
+                # With several targets configured, also record each one tagged by host
+                if len(self.network_collector.targets) > 1:
+                    await self._upload_target_metrics()
             
             except Exception as e:
                 logger.error(f"Error collecting network data: {e}")
-                await asyncio.sleep(60)
+            
+            # Wait until next collection
+            deadline = await self._wait_next_tick(deadline, self._network_interval)
+    
+    async def _upload_target_metrics(self):
+        """
+        Upload the latest ping metrics of every network target.
+        """
+        for target, metrics in self.network_collector.get_target_metrics().items():
+            if not metrics.get("success"):
+                logger.warning("No valid network metrics for %s", target)
+                continue
+            
+            await self.influx_uploader.upload_sensor_data(
+                measurement="network_target_performance",
+                tags={"target": target},
+                fields={
+                    k: metrics[k] for k in ("min_rtt", "avg_rtt", "max_rtt", "packet_loss")
+                }
+            )
+    
+    async def _supervise(self, name: str, factory: Callable[[], Awaitable[None]]):
+        """
+        Run a collector, restarting it after a short pause if it crashes.
+        
+        Args:
+            name (str): Collector name for logging.
+            factory (Callable[[], Awaitable[None]]): Creates a fresh run of the collector.
+        """
+        while self._running:
+            try:
+                await factory()
+                return
+            except Exception as e:
+                logger.exception(f"{name} crashed, restarting: {e}")
+            
+            # Pause before restarting, unless shutting down
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
     
     async def run(self):
         """
@@ -298,6 +499,7 @@ class DataCollectionManager:
             return
         
         self._running = True
+        self._stop_event.clear()
         
         # Initialize if not already done
         if not self.ina260_sensors and not self.sht30_sensor:
@@ -305,26 +507,27 @@ class DataCollectionManager:
         
         logger.info("Starting data collection")
         
-        # Start InfluxDB uploader background task
-        influx_task = asyncio.create_task(self.influx_uploader.run())
-        self.collection_tasks.append(influx_task)
+        # InfluxDB uploader and Redis stream flusher background tasks
+        collectors: List[Tuple[str, Callable[[], Awaitable[None]]]] = [
+            ("InfluxDB uploader", self.influx_uploader.run),
+            ("Redis stream flusher", self._stream_flusher),
+        ]
         
-        # Start a collection task for each sensor
-        for relay_id, sensor in self.ina260_sensors.items():
-            task = asyncio.create_task(self._collect_relay_data(relay_id, sensor))
-            self.collection_tasks.append(task)
+        # Relay data collection for all INA260 sensors
+        if self.ina260_sensors:
+            collectors.append(("Relay data collection", self._collect_relay_data))
         
-        # Start environmental data collection if sensor is available
+        # Environmental data collection if sensor is available
         if self.sht30_sensor:
-            task = asyncio.create_task(self._collect_environmental_data())
-            self.collection_tasks.append(task)
+            collectors.append(("Environmental data collection", self._collect_environmental_data))
         
-        # Start network data collection
-        network_task = asyncio.create_task(self._collect_network_data())
-        self.collection_tasks.append(network_task)
+        # Network data collection
+        collectors.append(("Network data collection", self._collect_network_data))
         
-        # Wait for all tasks to complete (they should run indefinitely)
-        await asyncio.gather(*self.collection_tasks, return_exceptions=True)
+        # Run every collector under supervision so a crash restarts it instead of silently stopping it
+        async with asyncio.TaskGroup() as group:
+            for name, factory in collectors:
+                self.collection_tasks.append(group.create_task(self._supervise(name, factory)))
         
         self._running = False
     
@@ -337,6 +540,7 @@ class DataCollectionManager:
         
         logger.info("Shutting down data collection")
         self._running = False
+        self._stop_event.set()
         
         # Cancel all collection tasks
         for task in self.collection_tasks:
@@ -353,6 +557,7 @@ class DataCollectionManager:
         
         # Close Redis connection if needed
         if self.redis:
+            await self._flush_streams()
             await self.redis.close()
             self.redis = None
         
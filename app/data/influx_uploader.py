@@ -4,45 +4,194 @@ Asynchronous InfluxDB Data Uploader
 Provides an efficient method to upload sensor data to InfluxDB.
 """
 import asyncio
+import gzip
 import logging
-from typing import Dict, List, Optional, Union
-from datetime import datetime, timezone
-from influxdb_client import Point
-from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
-from influxdb_client.client.write_api_async import WriteApiAsync
+import math
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple, Union
+from urllib.parse import urlencode
+from datetime import datetime, timedelta, timezone
+import aiohttp
+from influxdb_client import WritePrecision
 from app.utils.config import settings
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Nanoseconds per timestamp unit for each write precision
+_NS_PER_UNIT = {
+    WritePrecision.S: 1_000_000_000,
+    WritePrecision.MS: 1_000_000,
+    WritePrecision.US: 1_000,
+    WritePrecision.NS: 1,
+}
+
+# Send a batch once it is this full rather than waiting for the exact limit
+_FLUSH_FILL_RATIO = 0.8
+
+# Line protocol escaping (same rules as influxdb_client's Point)
+_ESCAPE_MEASUREMENT = str.maketrans({',': r'\,', ' ': r'\ ', '\n': r'\n', '\t': r'\t', '\r': r'\r'})
+_ESCAPE_KEY = str.maketrans({',': r'\,', '=': r'\=', ' ': r'\ ', '\n': r'\n', '\t': r'\t', '\r': r'\r'})
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+# Distinct tag/field key sets remembered in sorted order
+_KEY_ORDER_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=1024, typed=True)
+def _escape_tag_value(value: Any) -> str:
+    """
+    Convert a tag value to its escaped line protocol string.
+    
+    Devices report with the same tag values over and over, so results are cached.
+    
+    Args:
+        value (Any): Tag value
+    Returns:
+        str: Escaped value.
+    """
+    escaped = str(value).translate(_ESCAPE_KEY)
+    # A trailing backslash would escape the separator that follows
+    return escaped + ' ' if escaped.endswith('\\') else escaped
+
+
+def _format_field(value: Any) -> Optional[str]:
+    """
+    Format a numeric field value for line protocol.
+    
+    Args:
+        value (Any): Field value
+    Returns:
+        Optional[str]: Formatted value, or None if it cannot be written.
+    """
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return None
+        text = repr(value)
+        # Whole numbers are written without the trailing ".0"
+        return text[:-2] if text.endswith('.0') else text
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return f"{value}i"
+    return None
+
+# Seconds before an InfluxDB write request is abandoned
+_WRITE_TIMEOUT = 10
+
+# Attempts per batch on transient failures, with 1 s, 2 s, ... backoff between them
+_WRITE_ATTEMPTS = 3
+
+
+class _TransientWriteError(Exception):
+    """
+    InfluxDB write failure that is worth retrying (throttling or server error).
+    """
+
+# One HTTP session (and connection pool) shared by every uploader in the process
+_shared_session: Optional[aiohttp.ClientSession] = None
+_shared_refs = 0
+_shared_lock = asyncio.Lock()
+
+
+async def _get_shared_session(max_connections: int) -> aiohttp.ClientSession:
+    """
+    Get the process-wide HTTP session for InfluxDB writes, creating it on first use.
+    
+    Args:
+        max_connections (int): Connection pool size if the session is created
+    Returns:
+        aiohttp.ClientSession: The shared session.
+    """
+    global _shared_session, _shared_refs
+    async with _shared_lock:
+        if _shared_session is None:
+            _shared_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=max_connections, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=_WRITE_TIMEOUT)
+            )
+            logger.debug("InfluxDB client initialized successfully")
+        _shared_refs += 1
+        return _shared_session
+
+
+async def _release_shared_session():
+    """
+    Drop one reference to the shared HTTP session, closing it after the last one.
+    """
+    global _shared_session, _shared_refs
+    async with _shared_lock:
+        _shared_refs = max(0, _shared_refs - 1)
+        if _shared_refs or _shared_session is None:
+            return
+        session = _shared_session
+        _shared_session = None
+        await session.close()
+        logger.info("InfluxDB client closed")
+
 class InfluxUploader:
     """
     Manages asynchronous uploads to InfluxDB with batching.
     """
     def __init__(
         self, 
-        batch_size: int = 100,
-        flush_interval: int = 10
+        batch_size: int = 5000,
+        flush_interval: int = 10,
+        max_batch_bytes: int = 10 * 1024 * 1024,
+        precision: WritePrecision = WritePrecision.S,
+        max_inflight: int = 4,
+        max_queue_points: Optional[int] = None,
+        urls: Optional[List[str]] = None
     ):
         """
         Initialize the InfluxDB uploader.
         
         Args:
             batch_size (int): Number of points to batch before sending
-            flush_interval (int): Seconds to wait before sending partial batches
+            flush_interval (int): Maximum seconds a point waits before a partial batch is sent
+            max_batch_bytes (int): Approximate line protocol size to batch before sending
+            precision (WritePrecision): Timestamp precision of the written points
+            max_inflight (int): Maximum number of batch writes in progress at once
+            max_queue_points (Optional[int]): Points buffered before the oldest are dropped
+                (defaults to 10 batches)
+            urls (Optional[List[str]]): InfluxDB endpoints that batches are spread across
+                round-robin (defaults to the configured INFLUXDB_URLS)
         """
         self.batch_size = batch_size
         self.flush_interval = flush_interval
+        self.max_batch_bytes = max_batch_bytes
+        self._flush_points = max(1, int(batch_size * _FLUSH_FILL_RATIO))
+        self._flush_bytes = int(max_batch_bytes * _FLUSH_FILL_RATIO)
+        self._key_order: Dict[Tuple[str, ...], Tuple[Tuple[str, str], ...]] = {}
+        self._precision = precision
+        self._ns_per_unit = _NS_PER_UNIT[precision]
+        
+        # Batch storage (points pre-serialized to line protocol); a ring buffer
+        # so a stalled InfluxDB drops the oldest points instead of growing memory
+        self.batch_queue: Deque[bytes] = deque(maxlen=max_queue_points or 10 * batch_size)
+        self._batch_bytes = 0
+        self.dropped_points = 0
+        self._dropped_reported = 0
+        self._batch_created_at = 0.0  # Monotonic time the oldest unsent point was queued
+        self._wakeup = asyncio.Event()  # Set when a point arrives in an empty queue
         
-        # Batch storage
-        self.batch_queue: List[Point] = []
+        # HTTP session, and the write endpoint it posts line protocol to
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._urls = urls or settings.INFLUXDB_URLS
+        self._write_urls: List[str] = []
+        self._rr_idx = 0
+        self._headers: Dict[str, str] = {}
         
-        # Client and write API
-        self._client: Optional[InfluxDBClientAsync] = None
-        self._write_api: Optional[WriteApiAsync] = None
+        # In-flight batch writes
+        self._max_inflight = max_inflight
+        self._pending: Set[asyncio.Task] = set()
         
         # State management
         self._running = False
+        self._closing = False  # Set by shutdown; failed batches are no longer requeued
         
         # Configuration validation
         self._validate_config()
@@ -71,32 +220,37 @@ class InfluxUploader:
     
     async def _initialize_client(self):
         """
-        Initialize the InfluxDB async client.
+        Attach to the shared HTTP session and prepare the InfluxDB write request.
         """
-        if self._client is None:
+        if self._session is None:
             try:
                 self._validate_config()  # Revalidate before each attempt
                 
-                self._client = InfluxDBClientAsync(
-                    url=settings.INFLUXDB_URL, 
-                    token=settings.TOKEN, 
-                    org=settings.ORG
-                )
-                # Create write API
-                self._write_api = self._client.write_api()
-                logger.debug("InfluxDB client initialized successfully")
+                params = urlencode({
+                    "org": settings.ORG,
+                    "bucket": settings.BUCKET,
+                    "precision": self._precision
+                })
+                self._write_urls = [f"{url.rstrip('/')}/api/v2/write?{params}" for url in self._urls]
+                self._headers = {
+                    "Authorization": f"Token {settings.TOKEN}",
+                    "Content-Type": "text/plain; charset=utf-8"
+                }
+                if settings.INFLUXDB_GZIP:
+                    self._headers["Content-Encoding"] = "gzip"  # Compress write bodies
+                
+                self._session = await _get_shared_session(self._max_inflight)
             except Exception as e:
                 logger.error(f"Failed to initialize InfluxDB client: {e}")
                 # Do not re-raise to allow partial functionality
-                self._client = None
-                self._write_api = None
+                self._session = None
     
     async def upload_sensor_data(
         self, 
         measurement: str, 
         tags: Dict[str, str], 
         fields: Dict[str, Union[float, int]], 
-        timestamp: Optional[datetime] = None
+        timestamp: Optional[Union[datetime, int]] = None
     ):
         """
         Add a sensor data point to the upload batch.
@@ -105,83 +259,304 @@ class InfluxUploader:
             measurement (str): Name of the measurement
             tags (Dict[str, str]): Tags to identify the data point
             fields (Dict[str, Union[float, int]]): Numeric fields to store
-            timestamp (Optional[datetime]): Timestamp for the point
+            timestamp (Optional[Union[datetime, int]]): Timestamp for the point (int is in the uploader's precision)
         """
-        # Ensure client is initialized
-        if self._client is None:
-            await self._initialize_client()
+        # Add to batch queue
+        self._enqueue(self._build_line(measurement, tags, fields, timestamp))
         
-        # If initialization failed, silently return
-        if self._client is None:
+        # Check if batch is ready to send
+        if self._batch_ready():
+            await self._send_batch()
+    
+    async def upload_sensor_data_batch(
+        self,
+        readings: List[Tuple[str, Dict[str, str], Dict[str, Union[float, int]]]],
+        timestamp: Optional[Union[datetime, int]] = None
+    ):
+        """
+        Add several sensor data points to the upload batch at once.
+        
+        This is the fast path for collectors that produce their own numeric
+        fields; field types are trusted and not checked.
+        
+        Args:
+            readings (List[Tuple[str, Dict[str, str], Dict[str, Union[float, int]]]]):
+                (measurement, tags, fields) for each point; every field must be numeric
+            timestamp (Optional[Union[datetime, int]]): Timestamp shared by all the points (int is in the uploader's precision)
+        """
+        if not readings:
             return
         
-        # Create point
-        point = Point(measurement)
+        if timestamp is None:
+            timestamp = self._now()
+        for measurement, tags, fields in readings:
+            self._enqueue(self._build_line(measurement, tags, fields, timestamp, checked=False))
         
-        # Add tags
-        for tag_name, tag_value in tags.items():
-            point = point.tag(tag_name, str(tag_value))
+        # Check if batch is ready to send
+        if self._batch_ready():
+            await self._send_batch()
+    
+    def _enqueue(self, line: str):
+        """
+        Append a line protocol point to the batch.
+        
+        Args:
+            line (str): The serialized data point
+        """
+        if not line:
+            # A point without any valid field has no line protocol
+            return
+        line = line.encode()
+        queue = self.batch_queue
+        if not queue:
+            self._batch_created_at = time.monotonic()
+            self._wakeup.set()
+        elif len(queue) == queue.maxlen:
+            # The append below evicts the oldest line
+            self._batch_bytes -= len(queue[0]) + 1
+            self.dropped_points += 1
+        queue.append(line)
+        # +1 for the newline separating lines in the request body
+        self._batch_bytes += len(line) + 1
+    
+    def _take_batch(self) -> List[bytes]:
+        """
+        Remove the oldest lines from the queue, up to one batch worth.
         
+        Returns:
+            List[bytes]: Lines within the batch_size and max_batch_bytes limits.
+        """
+        queue = self.batch_queue
+        lines = []
+        size = 0
+        while queue and len(lines) < self.batch_size:
+            line_size = len(queue[0]) + 1
+            if lines and size + line_size > self.max_batch_bytes:
+                break
+            lines.append(queue.popleft())
+            size += line_size
+        self._batch_bytes -= size
+        return lines
+    
+    def _batch_ready(self) -> bool:
+        """
+        Check whether the batch is nearly full or its oldest point has waited flush_interval.
+        
+        Returns:
+            bool: True if the batch should be sent now.
+        """
+        return (
+            len(self.batch_queue) >= self._flush_points
+            or self._batch_bytes >= self._flush_bytes
+            or time.monotonic() - self._batch_created_at >= self.flush_interval
+        )
+    
+    def _build_line(
+        self,
+        measurement: str,
+        tags: Dict[str, str],
+        fields: Dict[str, Union[float, int]],
+        timestamp: Optional[Union[datetime, int]] = None,
+        checked: bool = True
+    ) -> str:
+        """
+        Format a sensor reading directly as a line protocol point.
+        
+        Args:
+            measurement (str): Name of the measurement
+            tags (Dict[str, str]): Tags to identify the data point
+            fields (Dict[str, Union[float, int]]): Numeric fields to store
+            timestamp (Optional[Union[datetime, int]]): Timestamp for the point (int is in the uploader's precision)
+            checked (bool): Skip non-numeric fields; False trusts the caller's field types
+            
+        Returns:
+            str: The line protocol point, or an empty string if it has no valid field.
+        """
         # Add fields
-        for field_name, field_value in fields.items():
-            if isinstance(field_value, (int, float)):
-                point = point.field(field_name, field_value)
-            else:
-                logger.warning(f"Skipping non-numeric field: {field_name}")
+        field_parts = []
+        for name, key in self._sorted_keys(fields):
+            value = fields[name]
+            if checked and not isinstance(value, (int, float)):
+                logger.warning("Skipping non-numeric field: %s", name)
+                continue
+            formatted = _format_field(value)
+            if formatted is not None:
+                field_parts.append(f"{key}={formatted}")
+        if not field_parts:
+            return ""
         
-        # Set timestamp (default to now if not provided)
-        point = point.time(timestamp or datetime.now(timezone.utc))
+        # Add tags (line protocol wants them sorted by key)
+        line = measurement.translate(_ESCAPE_MEASUREMENT)
+        for name, key in self._sorted_keys(tags):
+            value = _escape_tag_value(tags[name])
+            if key and value:
+                line += f",{key}={value}"
         
-        # Add to batch queue
-        self.batch_queue.append(point)
+        # Set timestamp (default to now if not provided); a coarse precision keeps line protocol short
+        if timestamp is None:
+            timestamp = self._now()
+        elif isinstance(timestamp, datetime):
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+            timestamp = (timestamp - _EPOCH) // _MICROSECOND * 1000 // self._ns_per_unit
+        return f"{line} {','.join(field_parts)} {timestamp}"
+    
+    def _sorted_keys(self, values: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+        """
+        Get the keys of a tag or field dict in sorted order, with their escaped form.
         
-        # Check if batch is ready to send
-        if len(self.batch_queue) >= self.batch_size:
-            await self._send_batch()
+        Args:
+            values (Dict[str, Any]): Tags or fields of a point
+        Returns:
+            Tuple[Tuple[str, str], ...]: (key, escaped key) pairs sorted by key.
+        """
+        names = tuple(values)
+        order = self._key_order.get(names)
+        if order is None:
+            if len(self._key_order) >= _KEY_ORDER_CACHE_SIZE:
+                self._key_order.clear()
+            order = tuple((name, str(name).translate(_ESCAPE_KEY)) for name in sorted(names))
+            self._key_order[names] = order
+        return order
+    
+    def _now(self) -> int:
+        """
+        Get the current time as an integer in the uploader's precision.
+        
+        Returns:
+            int: Current Unix time in units of the write precision.
+        """
+        return time.time_ns() // self._ns_per_unit
     
     async def _send_batch(self):
         """
-        Send the current batch of points to InfluxDB.
+        Send the queued points to InfluxDB in batches.
         """
         if not self.batch_queue:
             return
         
-        try:
-            # Re-initialize client if needed
-            if self._client is None:
-                await self._initialize_client()
-            
-            # If client is still None, skip sending
-            if self._client is None or self._write_api is None:
-                logger.warning("Cannot send batch - InfluxDB client not initialized")
-                return
-            
-            # Write points
-            await self._write_api.write(
-                bucket=settings.BUCKET, 
-                record=self.batch_queue
+        if self.dropped_points > self._dropped_reported:
+            logger.warning(
+                "Upload queue full - dropped %d oldest points (%d total)",
+                self.dropped_points - self._dropped_reported, self.dropped_points
             )
-            
-            logger.debug(f"Successfully uploaded {len(self.batch_queue)} points")
-            
-            # Clear the batch queue
-            self.batch_queue.clear()
+            self._dropped_reported = self.dropped_points
         
-        except Exception as e:
-            logger.error(f"Error uploading batch to InfluxDB: {e}")
-            # Clear batch to prevent repeated errors
-            self.batch_queue.clear()
+        # Re-initialize client if needed
+        if self._session is None:
+            await self._initialize_client()
+        
+        # If client is still None, skip sending
+        if self._session is None:
+            logger.warning("Cannot send batch - InfluxDB client not initialized")
+            # Restart the age budget so run() retries after flush_interval instead of spinning
+            self._batch_created_at = time.monotonic()
+            return
+        
+        # Hand batches to writer tasks so producers never wait on the HTTP
+        # round trip; with max_inflight writes running, the rest stays queued
+        while self.batch_queue and len(self._pending) < self._max_inflight:
+            lines = self._take_batch()
+            # Rotate through the endpoints so no single ingest node takes every batch
+            url = self._write_urls[self._rr_idx % len(self._write_urls)]
+            self._rr_idx += 1
+            task = asyncio.create_task(self._write_batch(url, lines))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        
+        if self.batch_queue:
+            # Points held back by max_inflight get a fresh age budget
+            self._batch_created_at = time.monotonic()
+    
+    async def _write_batch(self, url: str, lines: List[bytes]):
+        """
+        Write one batch to InfluxDB, retrying transient failures with backoff.
+        
+        A batch that still fails is put back at the front of the queue so it is
+        sent with the next flush; a rejected batch (client error) is dropped.
+        
+        Args:
+            url (str): Write endpoint to send the batch to
+            lines (List[bytes]): Line protocol points of the batch
+        """
+        # POST the line protocol straight to the v2 write endpoint
+        body = b"\n".join(lines)
+        if settings.INFLUXDB_GZIP:
+            body = gzip.compress(body)
+        
+        for attempt in range(_WRITE_ATTEMPTS):
+            try:
+                async with self._session.post(url, data=body, headers=self._headers) as response:
+                    if response.status != 204:
+                        message = f"HTTP {response.status}: {await response.text()}"
+                        if response.status == 429 or response.status >= 500:
+                            raise _TransientWriteError(message)
+                        raise RuntimeError(message)
+                logger.debug("Successfully uploaded %d points", len(lines))
+                return
+            except (_TransientWriteError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("Error uploading batch to InfluxDB (attempt %d/%d): %s", attempt + 1, _WRITE_ATTEMPTS, e)
+                if attempt + 1 < _WRITE_ATTEMPTS:
+                    await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                # Drop the batch to prevent repeated errors
+                logger.error("Error uploading batch to InfluxDB: %s", e)
+                return
+        
+        if self._closing:
+            logger.error("Dropping %d points - InfluxDB unavailable at shutdown", len(lines))
+        else:
+            self._requeue(lines)
+    
+    def _requeue(self, lines: List[bytes]):
+        """
+        Put the lines of a failed batch back at the front of the queue.
+        
+        Only as many lines as fit are kept; beyond that the oldest are dropped.
+        
+        Args:
+            lines (List[bytes]): Line protocol points of the batch, oldest first
+        """
+        queue = self.batch_queue
+        room = queue.maxlen - len(queue)
+        if room < len(lines):
+            self.dropped_points += len(lines) - room
+            lines = lines[len(lines) - room:] if room else []
+        if not lines:
+            return
+        if not queue:
+            self._batch_created_at = time.monotonic()
+            self._wakeup.set()
+        queue.extendleft(reversed(lines))
+        self._batch_bytes += sum(len(line) + 1 for line in lines)
+    
+    async def _wait_pending(self):
+        """
+        Wait for all in-flight batch writes to finish.
+        """
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
     
     async def run(self):
         """
-        Background task to periodically flush batched points.
+        Background task to flush partial batches when their oldest point reaches flush_interval.
         """
         self._running = True
         
         try:
             while self._running:
-                # Wait for flush interval
-                await asyncio.sleep(self.flush_interval)
+                # Nothing to age out - wait for the next point
+                if not self.batch_queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                
+                # Sleep until the oldest point is due; the batch may be sent and a
+                # new one started meanwhile, so re-check after waking
+                remaining = self._batch_created_at + self.flush_interval - time.monotonic()
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+                    continue
                 
                 # Flush any pending points
                 await self._send_batch()
@@ -199,17 +574,21 @@ class InfluxUploader:
         Gracefully shut down the uploader.
         """
         self._running = False
+        self._closing = True
+        self._wakeup.set()
         
-        # Final flush of any remaining points
-        await self._send_batch()
+        # Final flush of any remaining points, max_inflight batches at a time
+        while True:
+            await self._send_batch()
+            await self._wait_pending()
+            if not self.batch_queue or self._session is None:
+                break
         
-        # Close the client
-        if self._client:
+        # Release the shared session; the last uploader closes it
+        if self._session:
             try:
-                await self._client.close()
-                logger.info("InfluxDB client closed")
+                await _release_shared_session()
             except Exception as e:
                 logger.error(f"Error closing InfluxDB client: {e}")
             finally:
-                self._client = None
-                self._write_api = None
\ No newline at end of file
+                self._session = None
\ No newline at end of file
@@ -5,10 +5,11 @@ This module provides asynchronous network data collection capabilities,
 focusing on ping metrics to Google.
 """
 import asyncio
-import re
+import contextlib
 import json
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+import aioping
 
 # Set up logging
 logger = logging.getLogger("NetworkDataCollector")
@@ -18,20 +19,27 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# Seconds between echo requests to one target, matching the ping binary's default
+_PING_INTERVAL = 1.0
+
 class NetworkDataCollector:
     """
     Manages asynchronous collection of network performance metrics.
     """
-    def __init__(self, collection_interval: int = 60):
+    def __init__(self, collection_interval: int = 60, targets: Optional[List[str]] = None):
         """
         Initialize the NetworkDataCollector.
         
         Args:
             collection_interval (int): Time between data collection cycles.
+            targets (Optional[List[str]]): Hosts to ping each cycle; the first one
+                provides the primary metrics. Defaults to Google DNS.
         """
-        self.target = "8.8.8.8"  # Google DNS
+        self.targets = targets or ["8.8.8.8"]  # Google DNS
+        self.target = self.targets[0]
         self.collection_interval = collection_interval
         self._running = False
+        self._task: Optional[asyncio.Task] = None
         
         # Store the latest metrics
         self.ping_metrics: Dict[str, Any] = {
@@ -40,6 +48,9 @@ class NetworkDataCollector:
             "max_rtt": None,
             "packet_loss": None
         }
+        
+        # Latest ping result for every target, keyed by host
+        self.target_metrics: Dict[str, Dict[str, Any]] = {}
     
     async def _ping_target(self, target: str, count: int = 5) -> Dict[str, Any]:
         """
@@ -52,70 +63,61 @@ class NetworkDataCollector:
         Returns:
             Dict[str, Any]: Ping metrics
         """
-        try:
-            # Use the more modern Linux ping 
-            ping_cmd = [
-                "ping", "-c", str(count), 
-                "-W", "2",  # 2-second timeout 
-                target
-            ]
-            
-            # Run ping command
-            proc = await asyncio.create_subprocess_exec(
-                *ping_cmd, 
-                stdout=asyncio.subprocess.PIPE, 
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            # Wait for the process to complete
-            stdout, stderr = await proc.communicate()
-            
-            if proc.returncode is None or proc.returncode > 0:
-                # Ping failed
+        # Send the echo requests from in-process ICMP sockets rather than forking the
+        # ping binary, spaced like ping's default so loss and RTT mean the same as before
+        results = await asyncio.gather(
+            *(self._ping_once(target, i * _PING_INTERVAL) for i in range(count)),
+            return_exceptions=True
+        )
+        
+        rtts = []
+        for result in results:
+            if isinstance(result, float):
+                rtts.append(result * 1000)  # seconds -> ms
+            elif not isinstance(result, TimeoutError):
+                # Resolution or socket errors fail every request alike
+                logger.error("Ping error for %s: %s", target, result)
                 return {
                     "success": False,
-                    "error": stderr.decode('utf-8', errors='ignore').strip()
+                    "error": str(result)
                 }
-            
-            # Parse ping output
-            output = stdout.decode('utf-8', errors='ignore')
-            
-            # Extract metrics using regex
-            ping_stats = {}
-            
-            # Parse packet loss
-            loss_match = re.search(r'(\d+)%\s+packet\s+loss', output)
-            if loss_match:
-                ping_stats['packet_loss'] = float(loss_match.group(1))
-            
-            # Parse round-trip times
-            rtt_match = re.search(r'rtt\s+min/avg/max/mdev\s*=\s*([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+)\s*ms', output)
-            if rtt_match:
-                ping_stats.update({
-                    'min_rtt': float(rtt_match.group(1)),
-                    'avg_rtt': float(rtt_match.group(2)),
-                    'max_rtt': float(rtt_match.group(3))
-                })
-            
-            # Build full result
-            return {
-                "success": True,
-                **ping_stats
-            }
         
-        except Exception as e:
-            logger.error(f"Ping error for {target}: {e}")
+        if not rtts:
             return {
                 "success": False,
-                "error": str(e)
+                "error": f"No reply from {target}"
             }
+        
+        return {
+            "success": True,
+            "packet_loss": (count - len(rtts)) * 100.0 / count,
+            "min_rtt": min(rtts),
+            "avg_rtt": sum(rtts) / len(rtts),
+            "max_rtt": max(rtts)
+        }
+    
+    async def _ping_once(self, target: str, delay: float) -> float:
+        """
+        Send one echo request after a delay.
+        
+        Args:
+            target (str): Hostname or IP to ping
+            delay (float): Seconds to wait before sending
+        
+        Returns:
+            float: Round-trip time in seconds
+        """
+        await asyncio.sleep(delay)
+        return await aioping.ping(target, timeout=2)
     
     async def _network_data_collection_cycle(self):
         """
         Perform a complete network data collection cycle.
         """
-        # Collect ping metrics
-        metrics = await self._ping_target(self.target)
+        # Ping every target at once; a cycle takes as long as the slowest host
+        results = await asyncio.gather(*(self._ping_target(target) for target in self.targets))
+        self.target_metrics = dict(zip(self.targets, results))
+        metrics = results[0]
         
         # Update ping metrics
         if metrics['success']:
@@ -134,9 +136,9 @@ class NetworkDataCollector:
                 "packet_loss": None
             }
         
-        # Log collected metrics
-        logger.debug("Network Metrics:")
-        logger.debug(json.dumps(self.ping_metrics, indent=2))
+        # Log collected metrics (skip the JSON dump unless debug logging is on)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Network Metrics: %s", json.dumps(self.ping_metrics, indent=2))
     
     async def run(self):
         """
@@ -147,6 +149,7 @@ class NetworkDataCollector:
             return
         
         self._running = True
+        self._task = asyncio.current_task()
         logger.info("Starting network data collection")
         
         try:
@@ -163,6 +166,7 @@ class NetworkDataCollector:
             logger.error(f"Error in network data collection: {e}")
         finally:
             self._running = False
+            self._task = None
     
     async def shutdown(self):
         """
@@ -174,8 +178,12 @@ class NetworkDataCollector:
         logger.info("Shutting down network data collection")
         self._running = False
         
-        # Wait a moment to ensure cleanup
-        await asyncio.sleep(1)
+        # Interrupt the current ping or sleep and wait for run() to exit
+        task = self._task
+        if task and task is not asyncio.current_task():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
     
     def get_network_metrics(self) -> Dict[str, Any]:
         """
@@ -184,4 +192,13 @@ class NetworkDataCollector:
         Returns:
             Dict[str, Any]: Current network metrics
         """
-        return self.ping_metrics.copy()
\ No newline at end of file
+        return self.ping_metrics.copy()
+    
+    def get_target_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the latest ping result for every target.
+        
+        Returns:
+            Dict[str, Dict[str, Any]]: Ping metrics keyed by target host
+        """
+        return {target: metrics.copy() for target, metrics in self.target_metrics.items()}
\ No newline at end of file
@@ -7,11 +7,16 @@ This module handles all network-related configurations, including:
 - Applying network settings to the system
 """
 import asyncio
-import subprocess
+import contextlib
 import os
+import errno
+import fcntl
+import socket
+import stat
+import struct
 import tempfile
-from typing import Optional, List, Dict
-import ipaddress
+import time
+from typing import Optional, List, Dict, Tuple
 import logging
 from app.utils.validator import NetworkConfig
 
@@ -22,94 +27,210 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# Dotted subnet mask -> prefix length, precomputed for every IPv4 prefix
+def _mask_from_prefix(prefix: int) -> str:
+    mask = (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
+    return f"{mask >> 24}.{(mask >> 16) & 0xFF}.{(mask >> 8) & 0xFF}.{mask & 0xFF}"
+
+_MASK_TO_PREFIX = {_mask_from_prefix(prefix): prefix for prefix in range(33)}
+
+# ioctl requests and route flag used to query the kernel directly (linux/sockios.h, linux/route.h)
+_SIOCGIFADDR = 0x8915
+_SIOCGIFNETMASK = 0x891B
+_RTF_GATEWAY = 0x0002
+
+# Files whose changes invalidate a cached probe of the current configuration
+_CONFIG_FILES = ("/etc/resolv.conf", "/etc/dhcpcd.conf")
+
 class NetworkManager:
     """
     Manages network configuration for the system.
     """
-    def __init__(self, config: NetworkConfig):
+    def __init__(self, config: NetworkConfig, cache_ttl: float = 5.0):
         """
         Initialize the NetworkManager.
         
         Args:
             config (NetworkConfig): The network configuration.
+            cache_ttl (float): Seconds a probed configuration is reused by get_current_config,
+                as long as resolv.conf and dhcpcd.conf have not changed.
         """
         self.config = config
         self.interface = "eth0"  # Default network interface
         self._current_config = None
-        logger.debug(f"Initialized NetworkManager with config: {self.config}")
+        self._current_config_at = 0.0  # Monotonic time of the last probe
+        self._current_config_key = None  # Config file mtimes at the last probe
+        self._cache_ttl = cache_ttl
+        self._resolv_cache = None  # (mtime_ns, DNS servers) of the last resolv.conf read
+        logger.debug("Initialized NetworkManager with config: %s", self.config)
 
-    async def get_current_config(self) -> Dict:
+    def _cached_config(self) -> Optional[Dict]:
+        """
+        Get the last probed network configuration if it is still fresh.
+        
+        Returns:
+            Optional[Dict]: The cached configuration, or None if missing or expired.
+        """
+        if (
+            self._current_config is not None
+            and time.monotonic() - self._current_config_at < self._cache_ttl
+            and self._config_files_key() == self._current_config_key
+        ):
+            return self._current_config
+        return None
+    
+    def _config_files_key(self) -> Tuple[Optional[int], ...]:
+        """
+        Get the modification times of the files the probed configuration reads.
+        
+        /proc/net/route is not included: its mtime is always the current time.
+        
+        Returns:
+            Tuple[Optional[int], ...]: mtime in ns of each file, or None if missing.
+        """
+        key = []
+        for path in _CONFIG_FILES:
+            try:
+                key.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                key.append(None)
+        return tuple(key)
+
+    async def get_current_config(self, force_refresh: bool = False) -> Dict:
         """
         Get the current network configuration from the system.
         
+        Args:
+            force_refresh (bool): Probe the system even if a recent result is cached.
+        
         Returns:
             Dict: The current network configuration.
         """
+        if not force_refresh:
+            cached = self._cached_config()
+            if cached is not None:
+                return cached
+        
         logger.debug("Fetching current network configuration...")
         try:
+            # Taken before probing so a change made meanwhile invalidates the result
+            files_key = self._config_files_key()
+            # The probes are independent, so run them concurrently
+            ip_res, gw_res, dns_res, dhcp_res = await asyncio.gather(
+                self._fetch_ip_and_mask(),
+                self._fetch_gateway(),
+                self._get_dns_servers(),
+                self._is_dhcp_enabled(),
+                return_exceptions=True
+            )
+            
             result = {}
             
-            # Get IP address and subnet mask
-            logger.debug(f"Getting IP address and subnet mask for interface {self.interface}")
-            ip_proc = await asyncio.create_subprocess_exec(
-                "ip", "-o", "-4", "addr", "show", self.interface,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await ip_proc.communicate()
-            
-            if ip_proc.returncode == 0:
-                ip_output = stdout.decode().strip()
-                logger.debug(f"IP command output: {ip_output}")
-                if ip_output:
-                    ip_parts = ip_output.split()
-                    for i, part in enumerate(ip_parts):
-                        if part == "inet" and i + 1 < len(ip_parts):
-                            ip_addr = ip_parts[i + 1].split("/")[0]
-                            prefix = ip_parts[i + 1].split("/")[1]
-                            subnet_mask = self._prefix_to_subnet_mask(int(prefix))
-                            result["ip_address"] = ip_addr
-                            result["subnet_mask"] = subnet_mask
-                            logger.debug(f"Parsed IP address: {ip_addr}, Subnet mask: {subnet_mask}")
+            # IP address and subnet mask
+            if isinstance(ip_res, Exception):
+                logger.error(f"Error getting IP address: {ip_res}")
             else:
-                logger.error(f"Failed to get IP address: {stderr.decode()}")
-
-            # Get gateway
-            logger.debug("Getting default gateway")
-            gateway_proc = await asyncio.create_subprocess_exec(
-                "ip", "route", "show", "default",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await gateway_proc.communicate()
-            
-            if gateway_proc.returncode == 0:
-                gateway_output = stdout.decode().strip()
-                logger.debug(f"Gateway command output: {gateway_output}")
-                if gateway_output:
-                    parts = gateway_output.split()
-                    if len(parts) >= 3 and parts[0] == "default" and parts[1] == "via":
-                        result["gateway"] = parts[2]
-                        logger.debug(f"Parsed gateway: {result['gateway']}")
-            else:
-                logger.error(f"Failed to get gateway: {stderr.decode()}")
-
-            # Get DNS servers from resolv.conf
-            logger.debug("Getting DNS servers")
-            result["dns_servers"] = await self._get_dns_servers()
-            
-            # Check if DHCP is enabled
-            logger.debug("Checking if DHCP is enabled")
-            result["dhcp"] = await self._is_dhcp_enabled()
+                result.update(ip_res)
+            
+            # Gateway
+            if isinstance(gw_res, Exception):
+                logger.error(f"Error getting gateway: {gw_res}")
+            elif gw_res:
+                result["gateway"] = gw_res
+            
+            # DNS servers from resolv.conf
+            if isinstance(dns_res, Exception):
+                logger.error(f"Error reading DNS servers: {dns_res}")
+                dns_res = []
+            result["dns_servers"] = dns_res
+            
+            # DHCP status
+            if isinstance(dhcp_res, Exception):
+                logger.error(f"Error checking DHCP status: {dhcp_res}")
+                dhcp_res = False
+            result["dhcp"] = dhcp_res
             
             self._current_config = result
-            logger.debug(f"Current network configuration: {result}")
+            self._current_config_at = time.monotonic()
+            self._current_config_key = files_key
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Current network configuration: %s", result)
             return result
             
         except Exception as e:
             logger.error(f"Error getting current network configuration: {e}")
             return {}
     
+    async def _fetch_ip_and_mask(self) -> Dict[str, str]:
+        """
+        Get the IP address and subnet mask of the network interface.
+        
+        Returns:
+            Dict[str, str]: "ip_address" and "subnet_mask", or empty if not found.
+        """
+        logger.debug("Getting IP address and subnet mask for interface %s", self.interface)
+        try:
+            # Ask the kernel directly instead of running and parsing `ip addr`
+            ip_addr, subnet_mask = await asyncio.to_thread(self._read_interface_address)
+        except OSError as e:
+            if e.errno != errno.EADDRNOTAVAIL:
+                logger.error(f"Failed to get IP address: {e}")
+            # Otherwise the interface exists but has no IPv4 address
+            return {}
+        
+        logger.debug("Parsed IP address: %s, Subnet mask: %s", ip_addr, subnet_mask)
+        return {"ip_address": ip_addr, "subnet_mask": subnet_mask}
+    
+    def _read_interface_address(self) -> Tuple[str, str]:
+        """
+        Read the interface's primary IPv4 address and netmask with ioctl.
+        
+        Returns:
+            Tuple[str, str]: The IP address and subnet mask in dot notation.
+        """
+        ifreq = struct.pack("256s", self.interface.encode()[:15])
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            # struct ifreq: 16-byte name, then a sockaddr_in whose address is at offset 4
+            addr = fcntl.ioctl(sock.fileno(), _SIOCGIFADDR, ifreq)[20:24]
+            mask = fcntl.ioctl(sock.fileno(), _SIOCGIFNETMASK, ifreq)[20:24]
+        return socket.inet_ntoa(addr), socket.inet_ntoa(mask)
+    
+    async def _fetch_gateway(self) -> Optional[str]:
+        """
+        Get the default gateway.
+        
+        Returns:
+            Optional[str]: The gateway IP address, or None if not found.
+        """
+        logger.debug("Getting default gateway")
+        try:
+            # Read the kernel routing table instead of running `ip route`
+            gateway = await asyncio.to_thread(self._read_default_gateway)
+        except OSError as e:
+            logger.error(f"Failed to get gateway: {e}")
+            return None
+        
+        if gateway:
+            logger.debug("Parsed gateway: %s", gateway)
+        return gateway
+    
+    def _read_default_gateway(self) -> Optional[str]:
+        """
+        Find the first default route with a gateway in /proc/net/route.
+        
+        Returns:
+            Optional[str]: The gateway IP address, or None if there is no default route.
+        """
+        with open("/proc/net/route", "r") as f:
+            next(f, None)  # Header
+            for line in f:
+                fields = line.split()
+                # Iface, Destination, Gateway, Flags, ..., Mask; addresses are little-endian hex
+                if len(fields) >= 8 and fields[1] == "00000000" and fields[7] == "00000000":
+                    if int(fields[3], 16) & _RTF_GATEWAY:
+                        return socket.inet_ntoa(struct.pack("<I", int(fields[2], 16)))
+        return None
+    
     async def _get_dns_servers(self) -> List[str]:
         """
         Get the current DNS servers from resolv.conf.
@@ -118,20 +239,37 @@ class NetworkManager:
             List[str]: List of DNS server IP addresses.
         """
         logger.debug("Reading DNS servers from /etc/resolv.conf")
-        dns_servers = []
         try:
-            with open("/etc/resolv.conf", "r") as f:
-                for line in f:
-                    if line.startswith("nameserver"):
-                        parts = line.split()
-                        if len(parts) >= 2:
-                            dns_servers.append(parts[1])
-                            logger.debug(f"Found DNS server: {parts[1]}")
-            return dns_servers
+            # File I/O blocks, so keep it off the event loop
+            return await asyncio.to_thread(self._read_dns_servers)
         except Exception as e:
             logger.error(f"Error reading DNS servers: {e}")
             return []
     
+    def _read_dns_servers(self) -> List[str]:
+        """
+        Read and parse the nameserver entries of resolv.conf.
+        
+        Returns:
+            List[str]: List of DNS server IP addresses.
+        """
+        # resolv.conf rarely changes; reuse the last parse while its mtime is the same
+        mtime = os.stat("/etc/resolv.conf").st_mtime_ns
+        if self._resolv_cache is not None and self._resolv_cache[0] == mtime:
+            return list(self._resolv_cache[1])
+        
+        with open("/etc/resolv.conf", "rb") as f:
+            data = f.read()
+        dns_servers = [
+            parts[1].decode()
+            for parts in (line.split() for line in data.splitlines() if line.startswith(b"nameserver"))
+            if len(parts) >= 2
+        ]
+        logger.debug("Found DNS servers: %s", dns_servers)
+        
+        self._resolv_cache = (mtime, tuple(dns_servers))
+        return dns_servers
+    
     async def _is_dhcp_enabled(self) -> bool:
         """
         Check if DHCP is enabled for the network interface.
@@ -139,60 +277,158 @@ class NetworkManager:
         Returns:
             bool: True if DHCP is enabled, False otherwise.
         """
-        logger.debug(f"Checking if DHCP is enabled for interface {self.interface}")
+        logger.debug("Checking if DHCP is enabled for interface %s", self.interface)
         try:
-            # Check if dhclient is running for the interface
-            ps_proc = await asyncio.create_subprocess_exec(
-                "ps", "-aux",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await ps_proc.communicate()
-            
-            if ps_proc.returncode == 0:
-                output = stdout.decode()
-                dhcpcd_running = f"dhcpcd {self.interface}" in output or f"dhcpcd -i {self.interface}" in output
-                dhclient_running = f"dhclient {self.interface}" in output
-                is_dhcp = dhcpcd_running or dhclient_running
-                
-                # If no dhcp client running, check dhcpcd.conf
-                if not is_dhcp and os.path.exists("/etc/dhcpcd.conf"):
-                    # Check if interface is statically configured in dhcpcd.conf
-                    with open("/etc/dhcpcd.conf", "r") as f:
-                        content = f.read()
-                        if f"interface {self.interface}" in content and "static ip_address" in content:
-                            is_dhcp = False
-                        else:
-                            # Default is DHCP in dhcpcd.conf
-                            is_dhcp = True
-                
-                logger.debug(f"DHCP status for {self.interface}: {is_dhcp}")
-                return is_dhcp
-            else:
-                logger.error(f"Failed to check DHCP status: {stderr.decode()}")
-                return False
+            # Scanning /proc and reading dhcpcd.conf block, so keep them off the event loop
+            is_dhcp = await asyncio.to_thread(self._check_dhcp)
+            logger.debug("DHCP status for %s: %s", self.interface, is_dhcp)
+            return is_dhcp
         except Exception as e:
             logger.error(f"Error checking DHCP status: {e}")
             return False
     
-    def _prefix_to_subnet_mask(self, prefix: int) -> str:
+    def _check_dhcp(self) -> bool:
+        """
+        Determine from running clients and dhcpcd.conf whether DHCP is in use.
+        
+        Returns:
+            bool: True if DHCP is enabled, False otherwise.
+        """
+        # Check if dhclient or dhcpcd is running for the interface
+        if self._dhcp_client_running():
+            return True
+        
+        # If no dhcp client running, check dhcpcd.conf
+        if os.path.exists("/etc/dhcpcd.conf"):
+            # Check if interface is statically configured in dhcpcd.conf
+            with open("/etc/dhcpcd.conf", "r") as f:
+                content = f.read()
+            # Default is DHCP in dhcpcd.conf
+            return not (f"interface {self.interface}" in content and "static ip_address" in content)
+        return False
+    
+    def _dhcp_client_running(self) -> bool:
+        """
+        Check whether a DHCP client (dhclient or dhcpcd) is running for the interface.
+        
+        Looks for the client's pidfile first and otherwise scans /proc, rather
+        than forking ps and searching the whole process table. Only processes
+        whose comm names a DHCP client have their cmdline read.
+        
+        Returns:
+            bool: True if a DHCP client is running for the interface.
+        """
+        for pidfile in (f"/var/run/dhclient.{self.interface}.pid", f"/run/dhcpcd-{self.interface}.pid"):
+            try:
+                with open(pidfile, "r") as f:
+                    pid = f.read().strip()
+            except OSError:
+                continue
+            if pid.isdigit() and os.path.exists(f"/proc/{pid}"):
+                return True
+        
+        interface = self.interface.encode()
+        with os.scandir("/proc") as entries:
+            for entry in entries:
+                if not entry.name.isdigit():
+                    continue
+                try:
+                    # comm is a few bytes; only read the full cmdline of DHCP clients
+                    with open(f"/proc/{entry.name}/comm", "rb") as f:
+                        if f.read().rstrip(b"\n") not in (b"dhclient", b"dhcpcd"):
+                            continue
+                    with open(f"/proc/{entry.name}/cmdline", "rb") as f:
+                        argv = f.read().split(b"\0")
+                except OSError:
+                    # The process exited while scanning
+                    continue
+                if interface in argv[1:]:
+                    return True
+        return False
+    
+    async def _run_command(self, *args: str, capture: bool = False) -> Tuple[int, bytes, bytes]:
+        """
+        Run a command and wait for it to finish.
+        
+        Args:
+            *args (str): The command and its arguments.
+            capture (bool): Collect stdout; otherwise it is discarded unread.
+            
+        Returns:
+            Tuple[int, bytes, bytes]: Return code, stdout (empty unless captured) and stderr.
+        """
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE if capture else asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        # communicate() rather than wait(): stderr is a pipe and must be drained
+        stdout, stderr = await proc.communicate()
+        return proc.returncode, stdout or b"", stderr
+    
+    def _temp_dir_for(self, path: str) -> Optional[str]:
         """
-        Convert a prefix length to a subnet mask.
+        Choose where to create the temporary file for a configuration file.
         
         Args:
-            prefix (int): The prefix length (e.g., 24 for 255.255.255.0).
+            path (str): The configuration file that will be replaced.
             
         Returns:
-            str: The subnet mask in dot notation.
+            Optional[str]: The file's own directory if writable (so it can be renamed
+            into place), otherwise None for the default temporary directory.
+        """
+        directory = os.path.dirname(path)
+        return directory if os.access(directory, os.W_OK) else None
+    
+    async def _install_file(self, temp_file_path: str, path: str) -> Tuple[bool, str]:
+        """
+        Move a generated configuration file into place.
+        
+        The file is renamed over the target atomically when it was created next to
+        it; otherwise, or if the rename is not permitted, it is copied with sudo.
+        
+        Args:
+            temp_file_path (str): The generated temporary file.
+            path (str): The configuration file to replace.
+            
+        Returns:
+            Tuple[bool, str]: Whether it succeeded, and the error message if not.
         """
-        logger.debug(f"Converting prefix {prefix} to subnet mask")
         try:
-            subnet_mask = str(ipaddress.IPv4Network(f"0.0.0.0/{prefix}").netmask)
-            logger.debug(f"Converted prefix {prefix} to subnet mask {subnet_mask}")
-            return subnet_mask
-        except Exception as e:
-            logger.error(f"Error converting prefix to subnet mask: {e}")
-            return "255.255.255.0"  # Default subnet mask
+            if os.path.dirname(temp_file_path) == os.path.dirname(path):
+                try:
+                    await asyncio.to_thread(self._replace_file, temp_file_path, path)
+                    return True, ""
+                except PermissionError:
+                    pass
+            
+            returncode, _, stderr = await self._run_command("sudo", "cp", temp_file_path, path)
+            return returncode == 0, stderr.decode().strip()
+        finally:
+            # Remove the temporary file if it was copied rather than renamed
+            await asyncio.to_thread(self._remove_file, temp_file_path)
+    
+    def _remove_file(self, path: str) -> None:
+        """
+        Delete a file if it still exists.
+        
+        Args:
+            path (str): The file to delete.
+        """
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+    
+    def _replace_file(self, temp_file_path: str, path: str) -> None:
+        """
+        Atomically rename a file over another, keeping the target's permissions.
+        
+        Args:
+            temp_file_path (str): The file to move into place.
+            path (str): The file to replace.
+        """
+        mode = stat.S_IMODE(os.stat(path).st_mode) if os.path.exists(path) else 0o644
+        os.chmod(temp_file_path, mode)
+        os.replace(temp_file_path, path)
     
     def _subnet_mask_to_prefix(self, subnet_mask: str) -> int:
         """
@@ -204,8 +440,19 @@ class NetworkManager:
         Returns:
             int: The prefix length (e.g., 24).
         """
+        prefix = _MASK_TO_PREFIX.get(subnet_mask)
+        if prefix is not None:
+            return prefix
         try:
-            return sum(bin(int(x)).count('1') for x in subnet_mask.split('.'))
+            # Non-canonical spellings such as "255.255.255.000"
+            a, b, c, d = (int(x) for x in subnet_mask.split('.'))
+            if not all(0 <= x <= 255 for x in (a, b, c, d)):
+                raise ValueError(f"octet out of range in {subnet_mask}")
+            mask = (a << 24) | (b << 16) | (c << 8) | d
+            prefix = bin(mask).count('1')
+            if mask != (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF:
+                raise ValueError(f"{subnet_mask} is not a contiguous mask")
+            return prefix
         except Exception as e:
             logger.error(f"Error converting subnet mask to prefix: {e}")
             return 24  # Default prefix length
@@ -236,14 +483,9 @@ class NetworkManager:
             bool: True if exists, False otherwise.
         """
         try:
-            which_proc = await asyncio.create_subprocess_exec(
-                "which", command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await which_proc.communicate()
+            returncode, _, _ = await self._run_command("which", command)
             
-            return which_proc.returncode == 0
+            return returncode == 0
         except Exception:
             return False
 
@@ -263,34 +505,34 @@ class NetworkManager:
         
         # Check DHCP status
         if current_config.get('dhcp') != self.config.dhcp:
-            logger.debug(f"DHCP status mismatch: current={current_config.get('dhcp')}, desired={self.config.dhcp}")
+            logger.debug("DHCP status mismatch: current=%s, desired=%s", current_config.get('dhcp'), self.config.dhcp)
             return False
         
         # If using static IP, check all IP settings
         if not self.config.dhcp:
             # Check IP address
             if current_config.get('ip_address') != self.config.ip_address:
-                logger.debug(f"IP address mismatch: current={current_config.get('ip_address')}, desired={self.config.ip_address}")
+                logger.debug("IP address mismatch: current=%s, desired=%s", current_config.get('ip_address'), self.config.ip_address)
                 return False
             
             # Check subnet mask
             if current_config.get('subnet_mask') != self.config.subnet_mask:
-                logger.debug(f"Subnet mask mismatch: current={current_config.get('subnet_mask')}, desired={self.config.subnet_mask}")
+                logger.debug("Subnet mask mismatch: current=%s, desired=%s", current_config.get('subnet_mask'), self.config.subnet_mask)
                 return False
             
             # Check gateway
             if current_config.get('gateway') != self.config.gateway:
-                logger.debug(f"Gateway mismatch: current={current_config.get('gateway')}, desired={self.config.gateway}")
+                logger.debug("Gateway mismatch: current=%s, desired=%s", current_config.get('gateway'), self.config.gateway)
                 return False
         
         # Check DNS servers
         current_dns = current_config.get('dns_servers', [])
         if self.config.primary_dns not in current_dns:
-            logger.debug(f"Primary DNS mismatch: {self.config.primary_dns} not in {current_dns}")
+            logger.debug("Primary DNS mismatch: %s not in %s", self.config.primary_dns, current_dns)
             return False
         
         if self.config.secondary_dns and self.config.secondary_dns not in current_dns:
-            logger.debug(f"Secondary DNS mismatch: {self.config.secondary_dns} not in {current_dns}")
+            logger.debug("Secondary DNS mismatch: %s not in %s", self.config.secondary_dns, current_dns)
             return False
         
         logger.debug("Current network configuration matches desired configuration")
@@ -305,9 +547,16 @@ class NetworkManager:
         """
         logger.debug("Applying network configuration")
         try:
-            # Get current configuration to see if changes are needed
-            current_config = await self.get_current_config()
-            logger.debug(f"Current network configuration: {current_config}")
+            # A recent probe that already matches avoids spawning the probes again
+            cached_config = self._cached_config()
+            if cached_config is not None and self._config_matches_current(cached_config):
+                logger.info("Current network configuration already matches desired configuration")
+                return True
+            
+            # Confirm against a fresh probe before changing anything
+            current_config = await self.get_current_config(force_refresh=True)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Current network configuration: %s", current_config)
             
             if self._config_matches_current(current_config):
                 logger.info("Current network configuration already matches desired configuration")
@@ -331,6 +580,8 @@ class NetworkManager:
                 # Fallback to direct interfaces config
                 success = await self._apply_interfaces_config()
                 
+            # The system configuration may have changed; probe it again next time
+            self._current_config = None
             if success:
                 logger.info("Network configuration applied successfully")
             else:
@@ -352,7 +603,7 @@ class NetworkManager:
         
         try:
             # Create a temporary file for the new configuration
-            with tempfile.NamedTemporaryFile(mode='w+', delete=False) as temp_file:
+            with tempfile.NamedTemporaryFile(mode='w+', dir=self._temp_dir_for("/etc/dhcpcd.conf"), delete=False) as temp_file:
                 # Copy existing configuration first
                 if os.path.exists("/etc/dhcpcd.conf"):
                     in_our_interface_block = False
@@ -391,30 +642,16 @@ class NetworkManager:
                 
                 temp_file_path = temp_file.name
             
-            # Copy the new configuration to dhcpcd.conf
-            copy_proc = await asyncio.create_subprocess_exec(
-                "sudo", "cp", temp_file_path, "/etc/dhcpcd.conf",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await copy_proc.communicate()
-            
-            # Remove the temporary file
-            os.unlink(temp_file_path)
-            
-            if copy_proc.returncode != 0:
-                logger.error(f"Failed to update dhcpcd.conf: {stderr.decode().strip()}")
+            # Move the new configuration into place
+            success, error = await self._install_file(temp_file_path, "/etc/dhcpcd.conf")
+            if not success:
+                logger.error(f"Failed to update dhcpcd.conf: {error}")
                 return False
             
             # Restart dhcpcd service
-            restart_proc = await asyncio.create_subprocess_exec(
-                "sudo", "systemctl", "restart", "dhcpcd",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await restart_proc.communicate()
+            returncode, _, stderr = await self._run_command("sudo", "systemctl", "restart", "dhcpcd")
             
-            if restart_proc.returncode != 0:
+            if returncode != 0:
                 logger.error(f"Failed to restart dhcpcd: {stderr.decode().strip()}")
                 # Try to restart networking
                 return await self._restart_networking()
@@ -436,7 +673,8 @@ class NetworkManager:
         
         try:
             # Create netplan YAML configuration
-            with tempfile.NamedTemporaryFile(mode='w+', delete=False) as temp_file:
+            netplan_file = "/etc/netplan/01-netcfg.yaml"
+            with tempfile.NamedTemporaryFile(mode='w+', dir=self._temp_dir_for(netplan_file), delete=False) as temp_file:
                 temp_file.write("# Generated by DPM NetworkManager\n")
                 temp_file.write("network:\n")
                 temp_file.write("  version: 2\n")
@@ -464,31 +702,16 @@ class NetworkManager:
                 
                 temp_file_path = temp_file.name
             
-            # Copy the configuration to netplan
-            netplan_file = "/etc/netplan/01-netcfg.yaml"
-            copy_proc = await asyncio.create_subprocess_exec(
-                "sudo", "cp", temp_file_path, netplan_file,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await copy_proc.communicate()
-            
-            # Remove the temporary file
-            os.unlink(temp_file_path)
-            
-            if copy_proc.returncode != 0:
-                logger.error(f"Failed to update netplan configuration: {stderr.decode().strip()}")
+            # Move the configuration into place
+            success, error = await self._install_file(temp_file_path, netplan_file)
+            if not success:
+                logger.error(f"Failed to update netplan configuration: {error}")
                 return False
             
             # Apply the netplan configuration
-            apply_proc = await asyncio.create_subprocess_exec(
-                "sudo", "netplan", "apply",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await apply_proc.communicate()
+            returncode, _, stderr = await self._run_command("sudo", "netplan", "apply")
             
-            if apply_proc.returncode != 0:
+            if returncode != 0:
                 logger.error(f"Failed to apply netplan configuration: {stderr.decode().strip()}")
                 return False
             
@@ -509,15 +732,13 @@ class NetworkManager:
         
         try:
             # Get the current connection name for the interface
-            conn_proc = await asyncio.create_subprocess_exec(
+            returncode, stdout, stderr = await self._run_command(
                 "nmcli", "-t", "-f", "NAME,DEVICE", "connection", "show", "--active",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                capture=True
             )
-            stdout, stderr = await conn_proc.communicate()
             
             connection_name = None
-            if conn_proc.returncode == 0:
+            if returncode == 0:
                 output = stdout.decode().strip()
                 for line in output.split('\n'):
                     parts = line.split(':')
@@ -528,30 +749,25 @@ class NetworkManager:
             if not connection_name:
                 # Create a new connection if none exists
                 connection_name = f"{self.interface}-connection"
-                create_proc = await asyncio.create_subprocess_exec(
+                returncode, _, stderr = await self._run_command(
                     "sudo", "nmcli", "connection", "add", 
                     "type", "ethernet", 
                     "con-name", connection_name, 
-                    "ifname", self.interface,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
+                    "ifname", self.interface
                 )
-                stdout, stderr = await create_proc.communicate()
                 
-                if create_proc.returncode != 0:
+                if returncode != 0:
                     logger.error(f"Failed to create NetworkManager connection: {stderr.decode().strip()}")
                     return False
             
             # Modify the connection
             if self.config.dhcp:
                 # DHCP configuration
-                modify_proc = await asyncio.create_subprocess_exec(
+                cmd = [
                     "sudo", "nmcli", "connection", "modify", 
                     connection_name, 
-                    "ipv4.method", "auto",
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
+                    "ipv4.method", "auto"
+                ]
             else:
                 # Static IP configuration
                 cmd = [
@@ -567,28 +783,17 @@ class NetworkManager:
                 if self.config.secondary_dns:
                     dns_servers += f",{self.config.secondary_dns}"
                 cmd.extend(["ipv4.dns", dns_servers])
-                
-                modify_proc = await asyncio.create_subprocess_exec(
-                    *cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
             
-            stdout, stderr = await modify_proc.communicate()
+            returncode, _, stderr = await self._run_command(*cmd)
             
-            if modify_proc.returncode != 0:
+            if returncode != 0:
                 logger.error(f"Failed to modify NetworkManager connection: {stderr.decode().strip()}")
                 return False
             
             # Apply the connection
-            up_proc = await asyncio.create_subprocess_exec(
-                "sudo", "nmcli", "connection", "up", connection_name,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await up_proc.communicate()
+            returncode, _, stderr = await self._run_command("sudo", "nmcli", "connection", "up", connection_name)
             
-            if up_proc.returncode != 0:
+            if returncode != 0:
                 logger.error(f"Failed to apply NetworkManager connection: {stderr.decode().strip()}")
                 return False
             
@@ -609,7 +814,7 @@ class NetworkManager:
         
         try:
             # Create interfaces file
-            with tempfile.NamedTemporaryFile(mode='w+', delete=False) as temp_file:
+            with tempfile.NamedTemporaryFile(mode='w+', dir=self._temp_dir_for("/etc/network/interfaces"), delete=False) as temp_file:
                 temp_file.write("# Generated by DPM NetworkManager\n")
                 temp_file.write("# The loopback network interface\n")
                 temp_file.write("auto lo\n")
@@ -636,19 +841,10 @@ class NetworkManager:
                 
                 temp_file_path = temp_file.name
             
-            # Copy the configuration to interfaces file
-            copy_proc = await asyncio.create_subprocess_exec(
-                "sudo", "cp", temp_file_path, "/etc/network/interfaces",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await copy_proc.communicate()
-            
-            # Remove the temporary file
-            os.unlink(temp_file_path)
-            
-            if copy_proc.returncode != 0:
-                logger.error(f"Failed to update interfaces file: {stderr.decode().strip()}")
+            # Move the configuration into place
+            success, error = await self._install_file(temp_file_path, "/etc/network/interfaces")
+            if not success:
+                logger.error(f"Failed to update interfaces file: {error}")
                 return False
             
             # Restart networking
@@ -668,39 +864,24 @@ class NetworkManager:
         
         try:
             # Try systemd networking restart
-            restart_proc = await asyncio.create_subprocess_exec(
-                "sudo", "systemctl", "restart", "networking",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await restart_proc.communicate()
+            returncode, _, stderr = await self._run_command("sudo", "systemctl", "restart", "networking")
             
-            if restart_proc.returncode == 0:
+            if returncode == 0:
                 logger.info("Networking restarted successfully via systemd")
                 return True
             else:
                 logger.warning(f"Failed to restart networking via systemd: {stderr.decode().strip()}")
                 
                 # Try ifdown/ifup as fallback
-                logger.debug(f"Trying ifdown/ifup for interface {self.interface}")
-                down_proc = await asyncio.create_subprocess_exec(
-                    "sudo", "ifdown", self.interface,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                await down_proc.communicate()
+                logger.debug("Trying ifdown/ifup for interface %s", self.interface)
+                await self._run_command("sudo", "ifdown", self.interface)
                 
                 # Wait a moment before bringing the interface back up
                 await asyncio.sleep(2)
                 
-                up_proc = await asyncio.create_subprocess_exec(
-                    "sudo", "ifup", self.interface,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                stdout, stderr = await up_proc.communicate()
+                returncode, _, stderr = await self._run_command("sudo", "ifup", self.interface)
                 
-                if up_proc.returncode == 0:
+                if returncode == 0:
                     logger.info(f"Interface {self.interface} restarted successfully via ifdown/ifup")
                     return True
                 else:
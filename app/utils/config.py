@@ -6,6 +6,30 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def _env_positive_int(name: str, default: int) -> int:
+    """
+    Read a positive integer setting from the environment.
+    
+    Args:
+        name (str): Environment variable name.
+        default (int): Value used when the variable is unset or not a number.
+        
+    Returns:
+        int: The configured value, at least 1.
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        logger.warning(f"Invalid {name} value '{value}', using default {default}")
+        return default
+    if number < 1:
+        logger.warning(f"{name} must be at least 1, got {number}; using 1")
+        return 1
+    return number
+
 class Settings:
     _instance = None
 
@@ -55,11 +79,14 @@ class Settings:
         # Improved InfluxDB URL handling
         influxdb_url = os.getenv('INFLUXDB_URL')
         self.INFLUXDB_URL = influxdb_url if isinstance(influxdb_url, str) else 'http://influxdb:8086'
+        self.INFLUXDB_GZIP = os.getenv('INFLUXDB_GZIP', 'true').lower() in ('1', 'true', 'yes')
         
         # Validate InfluxDB settings
         if not self.INFLUXDB_URL:
             logger.warning("InfluxDB URL not set. Using default.")
             self.INFLUXDB_URL = 'http://influxdb:8086'
+        # Optional comma-separated ingest nodes; batches are spread across them round-robin
+        self.INFLUXDB_URLS = [url.strip() for url in os.getenv('INFLUXDB_URLS', '').split(',') if url.strip()] or [self.INFLUXDB_URL]
         
         # Added safety checks for other database variables
         if not self.TOKEN:
@@ -120,9 +147,13 @@ class Settings:
         
         # Network/Ping settings
         self.PING_TARGET = '8.8.8.8'
+        # Optional comma-separated hosts to ping each cycle; the first provides the primary network metrics
+        self.PING_TARGETS = [host.strip() for host in os.getenv('PING_TARGETS', '').split(',') if host.strip()] or [self.PING_TARGET]
 
         # Data collection settings
         self.COLLECTION_INTERVAL = 30
+        self.STREAM_BATCH_SIZE = _env_positive_int('STREAM_BATCH_SIZE', 20)  # Redis stream entries per pipeline flush
+        self.STREAM_QUEUE_SIZE = _env_positive_int('STREAM_QUEUE_SIZE', 1000)  # Max Redis stream entries waiting to be written
         self.NULL = -9999  # Value to use for missing data, may need to be adjusted based on data type
         self.SECRET_KEY = os.getenv('SECRET_KEY')
 settings = Settings()
\ No newline at end of file
@@ -32,6 +32,8 @@ DAY_VALUES = {
 }
 # Max value for days_mask (all days combined)
 MAX_DAYS_MASK = sum(DAY_VALUES.values())
+# (bit value, day name) pairs in DAY_VALUES order, for mask decoding
+_DAY_BITS = tuple((bit_value, day) for day, bit_value in DAY_VALUES.items())
 
 class NetworkConfig(BaseModel):
     """
@@ -317,13 +319,7 @@ def days_mask_to_names(days_mask: int) -> List[str]:
     Returns:
         List[str]: List of day names.
     """
-    result = []
-    
-    for day, bit_value in DAY_VALUES.items():
-        if (days_mask & bit_value) != 0:
-            result.append(day)
-            
-    return result
+    return [day for bit_value, day in _DAY_BITS if days_mask & bit_value]
 
 def day_names_to_mask(day_names: List[str]) -> int:
     """
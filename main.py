@@ -7,6 +7,7 @@ applying network and time settings.
 """
 import os
 import asyncio
+import signal
 import time
 from datetime import datetime, timezone
 from typing import Dict, List, Any, Optional
@@ -78,6 +79,18 @@ async def main():
         schedule_manager = ScheduleManager(config.relays, relay_manager)
         logger.info("Schedule manager initialized")
         
+        def reload_schedules():
+            # config.json is edited by the frontend; SIGHUP applies relay schedule changes without a restart
+            logger.info("Reloading relay schedules from configuration")
+            try:
+                new_config = load_config(config_path)
+            except Exception as e:
+                logger.error(f"Failed to reload configuration, keeping current schedules: {e}")
+                return
+            schedule_manager.reload(new_config.relays)
+        
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_schedules)
+        
         # Initialize data collection manager
         logger.info("Initializing data collection manager...")
         data_manager = DataCollectionManager(config, task_manager)
@@ -1,8 +1,48 @@
 import asyncio
 import logging
-from typing import Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
 import smbus2
 
+# Single worker thread for blocking I²C calls; the bus is serialized anyway.
+_i2c_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="i2c")
+
+
+def _build_crc8_table(polynomial: int) -> tuple:
+    """
+    Build a 256-entry lookup table for an MSB-first CRC-8.
+    """
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ polynomial) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return tuple(table)
+
+
+# Sensirion CRC-8: polynomial 0x31 (x^8 + x^5 + x^4 + 1), init 0xFF.
+_CRC8_TABLE = _build_crc8_table(0x31)
+
+
+def _crc8(data) -> int:
+    """
+    Compute the Sensirion CRC-8 checksum of a byte sequence.
+    """
+    crc = 0xFF
+    for byte in data:
+        crc = _CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+async def _run_i2c(func, *args):
+    """
+    Run a blocking I²C call on the dedicated bus thread.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_i2c_executor, func, *args)
+
+
 class INA260Sensor:
     _instances = {}
 
@@ -28,7 +68,7 @@ class INA260Sensor:
         """
         try:
             async with self._bus_lock:
-                raw = await asyncio.to_thread(self.bus.read_word_data, self.address, reg)
+                raw = await _run_i2c(self.bus.read_word_data, self.address, reg)
             return ((raw & 0xFF) << 8) | ((raw >> 8) & 0xFF)
         except Exception as e:
             logging.error(f"Error reading register {hex(reg)} from INA260 sensor at address {hex(self.address)}: {e}")
@@ -69,20 +109,32 @@ class INA260Sensor:
             logging.error(f"Error reading power from INA260 sensor at address {hex(self.address)}: {e}")
             return None
     
-    async def read_all(self) -> Optional[dict]:
+    def _read_all_sync(self) -> Tuple[int, int, int]:
         """
-        Asynchronously reads all sensor values (voltage, current, power).
-        Returns a dictionary with the values or None if an error occurs.
+        Read the current, voltage and power registers back to back.
+        Blocking; runs on the I²C executor as a single unit of work.
+        """
+        read = self.bus.read_word_data
+        return read(self.address, 0x01), read(self.address, 0x02), read(self.address, 0x03)
+
+    async def read_all(self) -> Optional[Tuple[float, float, float]]:
+        """
+        Asynchronously reads all sensor values in a single I²C job.
+        Returns (voltage, current, power) or None if an error occurs.
         """
         try:
-            voltage = await self.read_voltage()
-            current = await self.read_current()
-            power = await self.read_power()
-            return {
-                "voltage": voltage,
-                "current": current,
-                "power": power
-            }
+            async with self._bus_lock:
+                raw_current, raw_voltage, raw_power = await _run_i2c(self._read_all_sync)
+            raw_current = ((raw_current & 0xFF) << 8) | ((raw_current >> 8) & 0xFF)
+            raw_voltage = ((raw_voltage & 0xFF) << 8) | ((raw_voltage >> 8) & 0xFF)
+            raw_power = ((raw_power & 0xFF) << 8) | ((raw_power >> 8) & 0xFF)
+            if raw_current >= 0x8000:  # Handle two's complement.
+                raw_current -= 0x10000
+            return (
+                round(raw_voltage * 0.00125, 3),  # LSB = 1.25 mV.
+                round(raw_current * 0.00125, 3),  # LSB = 1.25 mA.
+                round(raw_power * 0.01, 3),  # LSB = 10 mW.
+            )
         except Exception as e:
             logging.error(f"Error reading all data from INA260 sensor at address {hex(self.address)}: {e}")
             return None
@@ -95,6 +147,11 @@ class SHT30Sensor:
     """
     _instance = None
 
+    # Raw 16-bit reading -> °F / %RH, folded into a single multiply-add.
+    _TEMP_F_SCALE = 175.0 * 9.0 / 5.0 / 65535.0
+    _TEMP_F_OFFSET = -45.0 * 9.0 / 5.0 + 32.0
+    _HUMIDITY_SCALE = 100.0 / 65535.0
+
     def __new__(cls, bus_num: int = 1, address: int = 0x45):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
@@ -109,6 +166,9 @@ class SHT30Sensor:
         self._initialized = True
         self._cached_data = None  # Cache sensor data.
         self._cache_timestamp = 0
+        # Reusable raw I²C transactions for a single-shot measurement.
+        self._measure_msg = smbus2.i2c_msg.write(address, [0x24, 0x00])
+        self._read_msg = smbus2.i2c_msg.read(address, 6)
 
     async def reset(self):
         """
@@ -116,12 +176,22 @@ class SHT30Sensor:
         """
         try:
             async with self._bus_lock:
-                await asyncio.to_thread(self.bus.write_i2c_block_data, self.address, 0x30, [0xA2])
+                await _run_i2c(self.bus.write_i2c_block_data, self.address, 0x30, [0xA2])
             await asyncio.sleep(0.01)  # Allow sensor to reset.
         except Exception as e:
             logging.error(f"Error resetting SHT30 sensor: {e}")
             raise
 
+    def _measure_sync(self):
+        """
+        Trigger a measurement, wait for it to complete and read the result.
+        Blocking; runs on the I²C executor as a single unit of work.
+        """
+        self.bus.i2c_rdwr(self._measure_msg)
+        time.sleep(0.05)  # Wait for measurement to complete.
+        self.bus.i2c_rdwr(self._read_msg)
+        return bytes(self._read_msg)
+
     async def _get_data(self):
         """
         Asynchronously retrieves and caches sensor data for a short interval
@@ -133,12 +203,11 @@ class SHT30Sensor:
 
         try:
             async with self._bus_lock:
-                await asyncio.to_thread(self.bus.write_i2c_block_data, self.address, 0x24, [0x00])
-            await asyncio.sleep(0.05)  # Wait for measurement to complete.
-            async with self._bus_lock:
-                data = await asyncio.to_thread(self.bus.read_i2c_block_data, self.address, 0x00, 6)
+                data = await _run_i2c(self._measure_sync)
             if len(data) != 6:
                 raise ValueError("Invalid data length received from SHT30 sensor.")
+            if _crc8(data[0:2]) != data[2] or _crc8(data[3:5]) != data[5]:
+                raise ValueError("CRC mismatch in data received from SHT30 sensor.")
             self._cached_data = data
             self._cache_timestamp = current_time
             return data
@@ -152,8 +221,8 @@ class SHT30Sensor:
         """
         try:
             data = await self._get_data()
-            temp_raw = (data[0] << 8) | data[1]
-            temperature_f = round((-45 + 175 * (temp_raw / 65535.0)) * 9 / 5 + 32, 1)
+            temp_raw = int.from_bytes(data[0:2], "big")
+            temperature_f = round(temp_raw * self._TEMP_F_SCALE + self._TEMP_F_OFFSET, 1)
             return temperature_f
         except Exception as e:
             logging.error(f"Error reading temperature from SHT30 sensor: {e}")
@@ -165,8 +234,8 @@ class SHT30Sensor:
         """
         try:
             data = await self._get_data()
-            humidity_raw = (data[3] << 8) | data[4]
-            humidity = round(100 * (humidity_raw / 65535.0), 1)
+            humidity_raw = int.from_bytes(data[3:5], "big")
+            humidity = round(humidity_raw * self._HUMIDITY_SCALE, 1)
             return humidity
         except Exception as e:
             logging.error(f"Error reading humidity from SHT30 sensor: {e}")
@@ -0,0 +1,168 @@
+"""
+Tests for the InfluxDB uploader's queueing, retry and shutdown handling.
+
+Run with: python -m unittest discover tests
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+from app.data import influx_uploader
+from app.data.influx_uploader import InfluxUploader
+from app.utils.config import settings
+
+
+class _FakeResponse:
+    def __init__(self, status: int):
+        self.status = status
+
+    async def text(self) -> str:
+        return "error"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _FakeSession:
+    """
+    Records every write and answers with the next queued status (204 once they run out).
+    """
+    def __init__(self, statuses=(), delay: float = 0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.writes = []
+
+    def post(self, url, data, headers):
+        return _FakePost(self, url, data)
+
+
+class _FakePost:
+    def __init__(self, session: _FakeSession, url: str, data: bytes):
+        self.session = session
+        self.url = url
+        self.data = data
+
+    async def __aenter__(self):
+        if self.session.delay:
+            await asyncio.sleep(self.session.delay)
+        self.session.writes.append((self.url, self.data.split(b"\n")))
+        status = self.session.statuses.pop(0) if self.session.statuses else 204
+        return _FakeResponse(status)
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def _lines(count: int):
+    return [f"m value={i}i".encode() for i in range(count)]
+
+
+class InfluxUploaderTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        for name, value in (("TOKEN", "token"), ("INFLUXDB_GZIP", False)):
+            patcher = mock.patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # One attempt per batch so failures don't wait through the backoff
+        patcher = mock.patch.object(influx_uploader, "_WRITE_ATTEMPTS", 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _uploader(self, session: _FakeSession, urls=("http://a",), **kwargs) -> InfluxUploader:
+        uploader = InfluxUploader(urls=list(urls), **kwargs)
+        uploader._session = session
+        uploader._write_urls = [f"{url}/api/v2/write" for url in urls]
+        return uploader
+
+    def _fill(self, uploader: InfluxUploader, lines):
+        for line in lines:
+            uploader._enqueue(line.decode())
+
+    def assertQueue(self, uploader: InfluxUploader, lines):
+        self.assertEqual(list(uploader.batch_queue), lines)
+        self.assertEqual(uploader._batch_bytes, sum(len(line) + 1 for line in lines))
+
+    async def test_failed_write_is_requeued_in_order(self):
+        session = _FakeSession(statuses=[503])
+        uploader = self._uploader(session, batch_size=2)
+        lines = _lines(4)
+        self._fill(uploader, lines)
+
+        batch = uploader._take_batch()
+        self.assertEqual(batch, lines[:2])
+        await uploader._write_batch(uploader._write_urls[0], batch)
+
+        # The failed batch goes back in front of the points queued after it
+        self.assertQueue(uploader, lines)
+        self.assertEqual(uploader.dropped_points, 0)
+
+    async def test_rejected_write_is_dropped(self):
+        session = _FakeSession(statuses=[400])
+        uploader = self._uploader(session, batch_size=2)
+        lines = _lines(3)
+        self._fill(uploader, lines)
+
+        await uploader._write_batch(uploader._write_urls[0], uploader._take_batch())
+        self.assertQueue(uploader, lines[2:])
+
+    async def test_overflow_drops_oldest_points(self):
+        uploader = self._uploader(_FakeSession(), max_queue_points=3)
+        lines = _lines(5)
+        self._fill(uploader, lines)
+
+        self.assertQueue(uploader, lines[2:])
+        self.assertEqual(uploader.dropped_points, 2)
+
+    async def test_requeue_into_full_queue_drops_oldest_points(self):
+        uploader = self._uploader(_FakeSession(), max_queue_points=4)
+        lines = _lines(6)
+        self._fill(uploader, lines[3:])
+
+        # Only one slot is free, so only the newest line of the failed batch fits
+        uploader._requeue(lines[:3])
+        self.assertQueue(uploader, lines[2:])
+        self.assertEqual(uploader.dropped_points, 2)
+
+    async def test_batches_rotate_across_urls(self):
+        session = _FakeSession()
+        uploader = self._uploader(session, urls=("http://a", "http://b"), batch_size=1)
+        self._fill(uploader, _lines(3))
+
+        await uploader._send_batch()
+        await uploader._wait_pending()
+        self.assertEqual(
+            [url for url, _ in session.writes],
+            ["http://a/api/v2/write", "http://b/api/v2/write", "http://a/api/v2/write"],
+        )
+
+    async def test_shutdown_drains_queue_and_pending_writes(self):
+        session = _FakeSession(delay=0.01)
+        uploader = self._uploader(session, batch_size=2, max_inflight=1)
+        lines = _lines(5)
+        self._fill(uploader, lines)
+
+        # One write is in flight when shutdown starts
+        await uploader._send_batch()
+        self.assertEqual(len(uploader._pending), 1)
+
+        await uploader.shutdown()
+        self.assertEqual([line for _, batch in session.writes for line in batch], lines)
+        self.assertQueue(uploader, [])
+        self.assertFalse(uploader._pending)
+        self.assertIsNone(uploader._session)
+
+    async def test_shutdown_drops_batches_that_still_fail(self):
+        session = _FakeSession(statuses=[503] * 3)
+        uploader = self._uploader(session, batch_size=2)
+        self._fill(uploader, _lines(3))
+
+        await uploader.shutdown()
+        self.assertEqual(len(session.writes), 2)
+        self.assertQueue(uploader, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Tests for the relay schedule wake-up calculation.
+
+Run with: python -m unittest discover tests
+"""
+import unittest
+from datetime import datetime, timedelta
+
+from app.core.schedule import (
+    DAY_VALUES,
+    ScheduleManager,
+    _build_week_table,
+    _next_table_change,
+    next_schedule_change,
+)
+from app.utils.validator import RelaySchedule
+
+# 2024-01-01 is a Monday
+MONDAY = datetime(2024, 1, 1)
+
+
+def _schedule(on_time: str, off_time: str, *days: str) -> RelaySchedule:
+    return RelaySchedule(
+        enabled=True,
+        on_time=on_time,
+        off_time=off_time,
+        days_mask=sum(DAY_VALUES[day] for day in days),
+    )
+
+
+class NextTableChangeTest(unittest.TestCase):
+    def _assert_matches_table(self, schedule: RelaySchedule):
+        """
+        Every minute of the week, the predicted change must be the first minute the table flips.
+        """
+        manager = ScheduleManager([], None)
+        table = _build_week_table(schedule)
+        for minute in range(7 * 24 * 60):
+            now = MONDAY + timedelta(minutes=minute, seconds=30)
+            change_time, state = _next_table_change(table, now)
+
+            current = manager._should_be_on("relay", schedule, now)
+            self.assertNotEqual(current, state)
+            self.assertEqual(manager._should_be_on("relay", schedule, change_time), state)
+            before = change_time - timedelta(minutes=1)
+            self.assertEqual(manager._should_be_on("relay", schedule, before), current, now)
+
+    def test_overnight_schedule_turns_off_at_midnight(self):
+        schedule = _schedule("22:00", "06:00", "Monday")
+        change = _next_table_change(_build_week_table(schedule), MONDAY.replace(hour=22, minute=30))
+        self.assertEqual(change, (datetime(2024, 1, 2, 0, 0), False))
+
+    def test_overnight_schedule_turns_on_at_midnight(self):
+        schedule = _schedule("22:00", "06:00", "Tuesday")
+        change = _next_table_change(_build_week_table(schedule), MONDAY.replace(hour=12))
+        self.assertEqual(change, (datetime(2024, 1, 2, 0, 0), True))
+
+    def test_overnight_schedules_match_table(self):
+        self._assert_matches_table(_schedule("22:00", "06:00", "Monday"))
+        self._assert_matches_table(_schedule("22:00", "06:00", "Sunday", "Monday", "Friday"))
+
+    def test_regular_schedule_matches_table(self):
+        self._assert_matches_table(_schedule("08:00", "18:00", "Monday", "Wednesday"))
+
+    def test_constant_schedule_has_no_change(self):
+        schedule = _schedule("08:00", "08:00", *DAY_VALUES)
+        self.assertIsNone(_next_table_change(_build_week_table(schedule), MONDAY))
+        self.assertIsNone(next_schedule_change(RelaySchedule(enabled=False)))
+
+
+if __name__ == "__main__":
+    unittest.main()